@@ -0,0 +1,30 @@
+class AnimationClock:
+    """一组动画帧共用的时钟, 所有订阅它的sprite显示同一帧"""
+
+    def __init__(self, frames, speed):
+        self.frames = frames
+        self.speed = speed  # 每秒播放的帧数
+        self.frame_index = 0
+        self.frame = frames[0]
+
+    def update(self, dt):
+        self.frame_index += self.speed * dt
+        if self.frame_index >= len(self.frames):
+            self.frame_index = 0
+        self.frame = self.frames[int(self.frame_index)]
+
+
+class AnimationClocks:
+    """按名称管理动画时钟, 每个tick统一更新一次, 与订阅的sprite数量无关"""
+
+    def __init__(self):
+        self.clocks = {}
+
+    def get(self, name, frames, speed):
+        if name not in self.clocks:
+            self.clocks[name] = AnimationClock(frames, speed)
+        return self.clocks[name]
+
+    def update(self, dt):
+        for clock in self.clocks.values():
+            clock.update(dt)
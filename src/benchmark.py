@@ -0,0 +1,229 @@
+"""无窗口的性能基准测试
+
+在SDL dummy显示驱动下运行Level, 使用固定dt和脚本输入, 分别统计绘制/更新/界面各阶段的耗时.
+在项目根目录运行:
+
+    python src/benchmark.py --frames 600 --scales 1 4 16 --out bench.json
+    python src/benchmark.py --baseline bench.json
+    python src/benchmark.py --dirty --idle  # 局部重绘模式下的静止场景
+    python src/benchmark.py --render-scale 0.5  # 世界画在半分辨率的离屏surface上再放大
+    python src/benchmark.py --agents 1000  # 同时有1000个agent按flow field寻路
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from settings import *
+
+# 脚本输入: (按下的键, 持续帧数), 循环执行
+INPUT_SCRIPT = [
+    ((pygame.K_RIGHT,), 90),
+    ((pygame.K_DOWN,), 60),
+    ((pygame.K_SPACE,), 1),
+    ((pygame.K_LEFT,), 90),
+    ((pygame.K_q,), 1),
+    ((pygame.K_UP,), 60),
+    ((pygame.K_LEFT, pygame.K_UP), 30),
+    ((pygame.K_RIGHT, pygame.K_DOWN), 30),
+]
+
+PHASES = ('draw', 'update', 'overlay', 'present', 'frame')
+
+AGENT_GOALS = ('water', 'house', 'trees')  # agent全部到达后从所在位置走向下一种目标
+
+
+class ScriptedKeys:
+    """模拟 pygame.key.get_pressed() 的返回值, 按INPUT_SCRIPT逐帧推进"""
+
+    def __init__(self, script=INPUT_SCRIPT):
+        self.frames = [keys for keys, length in script for _ in range(length)]
+        self.frame = 0
+        self.pressed = ()
+
+    def advance(self):
+        self.pressed = self.frames[self.frame % len(self.frames)]
+        self.frame += 1
+
+    def __call__(self):
+        return self
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+def square_number(text):
+    """argparse的type: 平铺地图的倍数必须是平方数"""
+    value = int(text)
+    if value < 1 or math.isqrt(value) ** 2 != value:
+        raise argparse.ArgumentTypeError(f'must be a square number, got {text}')
+    return value
+
+
+def percentile(values, q):
+    """values需已排序, 使用最近秩法"""
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def summarize(samples):
+    values = sorted(samples)
+    return {
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': values[-1],
+    }
+
+
+def spawn_agents(level, count):
+    """在随机的可通行瓦片中心放置count个agent"""
+    ys, xs = (level.nav_grid.blocked == 0).nonzero()
+    tiles = random.choices(list(zip(xs.tolist(), ys.tolist())), k=count)
+    return [(x * TILE_SIZE + TILE_SIZE / 2, y * TILE_SIZE + TILE_SIZE / 2) for x, y in tiles]
+
+
+def run_scale(scale, frames, warmup, dt, seed, dirty=False, idle=False, rain=False, render_scale=1, agents=0):
+    from level import Level
+    from levelcache import load_level
+    from resources import registry
+
+    side = math.isqrt(scale)
+    if side * side != scale:
+        raise ValueError(f'scale must be a square number, got {scale}')
+
+    random.seed(seed)
+    level_data = load_level(MAP_PATH)
+    if side > 1:
+        level_data = level_data.tiled(side, side)
+
+    start = perf_counter()
+    level = Level(level_data=level_data)
+    load_ms = (perf_counter() - start) * 1000
+
+    level.dirty_rendering = dirty
+    level.rain.raining = rain
+    level.all_sprites.render_scale = render_scale
+    keys = ScriptedKeys([((), 1)] if idle else INPUT_SCRIPT)
+    level.player.key_source = keys
+    positions = spawn_agents(level, agents) if agents else None
+    trips = 0
+    samples = {phase: [] for phase in PHASES}
+    for frame in range(warmup + frames):
+        keys.advance()
+        if positions and not level.agent_groups:
+            group = level.send_agents(positions, AGENT_GOALS[trips % len(AGENT_GOALS)])
+            positions = list(zip(group.x.tolist(), group.y.tolist()))
+            trips += 1
+        # 与Level.run的顺序相同: 先更新再绘制
+        t0 = perf_counter()
+        level.update(dt)
+        t1 = perf_counter()
+        dirty_rects = level.draw()
+        t2 = perf_counter()
+        level.overlay.display()
+        t3 = perf_counter()
+        if dirty_rects is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(dirty_rects)
+        t4 = perf_counter()
+        if frame >= warmup:
+            for phase, duration in zip(PHASES, (t2 - t1, t1 - t0, t3 - t2, t4 - t3, t4 - t0)):
+                samples[phase].append(duration * 1000)
+
+    return {
+        'sprites': len(level.all_sprites),
+        'collision_objects': len(level.collision_sprites.spatial_index),
+        'load_ms': load_ms,
+        'agents': {'count': agents, 'trips': trips,
+                   'fields_hits': level.flow_fields.hits, 'fields_misses': level.flow_fields.misses},
+        'assets': registry.stats(),  # 资源缓存在各个规模之间共享, 数值是累计的
+        'phases': {phase: summarize(values) for phase, values in samples.items()},
+    }
+
+
+def print_result(name, result, baseline=None):
+    print(f"{name}: {result['sprites']} sprites, load {result['load_ms']:.0f} ms")
+    assets = result['assets']
+    print(f"  assets   {assets['surfaces']} surfaces ({assets['shared']} shared), {assets['atlases']} atlases, "
+          f"hits {assets['hits']} misses {assets['misses']}, {assets['pixel_bytes'] / 1024:.0f} KiB")
+    agents = result.get('agents')
+    if agents and agents['count']:
+        print(f"  agents   {agents['count']} x {agents['trips']} trips, "
+              f"flow fields hits {agents['fields_hits']} misses {agents['fields_misses']}")
+    for phase, stats in result['phases'].items():
+        line = (f"  {phase:<8} mean {stats['mean']:7.3f}  p50 {stats['p50']:7.3f}  "
+                f"p90 {stats['p90']:7.3f}  p99 {stats['p99']:7.3f}  max {stats['max']:7.3f} ms")
+        if baseline and phase in baseline['phases']:
+            old = baseline['phases'][phase]['p50']
+            line += f"  (p50 {(stats['p50'] - old) / old * 100:+.1f}% vs baseline)" if old else ''
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless Level benchmark')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--dt', type=float, default=1 / 60)
+    parser.add_argument('--scales', type=square_number, nargs='+', default=[1, 4, 16],
+                        help='sprite count multiples of the shipped map, must be square numbers')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dirty', action='store_true', help='use dirty-rectangle rendering')
+    parser.add_argument('--idle', action='store_true', help='no input, the camera stays still')
+    parser.add_argument('--rain', action='store_true', help='keep it raining for the whole run')
+    parser.add_argument('--render-scale', type=float, default=1,
+                        help='draw the world at this fraction of the window resolution, e.g. 0.5 or 0.75')
+    parser.add_argument('--agents', type=int, default=0, help='agents walking between water, house and trees')
+    parser.add_argument('--out', help='save results as JSON')
+    parser.add_argument('--baseline', help='JSON file from an earlier run to compare against')
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+
+    results = {}
+    for scale in args.scales:
+        name = f'{scale}x'
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            results[name] = run_scale(scale, args.frames, args.warmup, args.dt, args.seed,
+                                      args.dirty, args.idle, args.rain, args.render_scale, args.agents)
+        print_result(name, results[name], baseline.get(name))
+
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump({
+                'meta': {
+                    'frames': args.frames,
+                    'warmup': args.warmup,
+                    'dt': args.dt,
+                    'seed': args.seed,
+                    'dirty': args.dirty,
+                    'idle': args.idle,
+                    'rain': args.rain,
+                    'render_scale': args.render_scale,
+                    'agents': args.agents,
+                    'python': platform.python_version(),
+                    'pygame': pygame.version.ver,
+                    'platform': platform.platform(),
+                },
+                'results': results,
+            }, file, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import numpy as np
+import pygame
+from itertools import count
+from settings import *
+from spatial import SpatialGrid
+
+
+class StaticHitbox:
+    """只有碰撞箱的静态障碍物, 没有图像也不是sprite"""
+    __slots__ = ('hitbox',)
+
+    def __init__(self, hitbox):
+        self.hitbox = hitbox
+
+
+def solid_tile_rects(tiles, width, height):
+    """把相邻的实心瓦片合并成尽量大的矩形, 返回世界坐标中的碰撞箱
+
+    先在每一行中找出连续的实心段, 再把下一行完全相同的段向下合并.
+    每个矩形向内收缩的距离与单个瓦片的Generic碰撞箱相同
+    """
+    solid = np.zeros((height + 1, width + 2), dtype=bool)  # 多一行一列作为边界
+    for x, y in tiles:
+        solid[y, x + 1] = True
+
+    rects = []
+    open_runs = {}  # (start_col, end_col) -> start_row
+    for row in range(height + 1):
+        edges = np.flatnonzero(np.diff(solid[row].astype(np.int8)))
+        runs = set(zip(edges[::2], edges[1::2]))
+        for run in list(open_runs):
+            if run not in runs:
+                start_row = open_runs.pop(run)
+                rects.append((run[0], start_row, run[1] - run[0], row - start_row))
+        for run in runs:
+            open_runs.setdefault(run, row)
+
+    return [pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, w * TILE_SIZE, h * TILE_SIZE)
+            .inflate(-TILE_SIZE * 0.2, -TILE_SIZE * 0.75)
+            for x, y, w, h in sorted(rects, key=lambda rect: (rect[1], rect[0]))]
+
+
+class CollisionGroup(pygame.sprite.Group):
+    """碰撞物体组, 按hitbox建立空间哈希, 只返回某个范围附近的物体"""
+
+    def __init__(self):
+        super().__init__()
+        self.spatial_index = SpatialGrid(TILE_SIZE)
+        self.pending_sprites = {}  # 与CameraGroup相同, 加入组时还没有hitbox
+        self.order = {}  # 加入顺序, 保证碰撞处理顺序与遍历整个组时一致
+        self.counter = count()
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.pending_sprites[sprite] = None
+        self.order[sprite] = next(self.counter)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.pending_sprites.pop(sprite, None)
+        self.spatial_index.remove(sprite)
+        del self.order[sprite]
+
+    def index_pending(self):
+        for sprite in self.pending_sprites:
+            if hasattr(sprite, 'hitbox'):  # 没有碰撞箱的物体不参与碰撞
+                self.spatial_index.insert(sprite, sprite.hitbox)
+        self.pending_sprites.clear()
+
+    def refresh(self, sprite):
+        """sprite的hitbox被修改后调用(例如树被砍倒)"""
+        if sprite in self.spatial_index:
+            self.spatial_index.move(sprite, sprite.hitbox)
+
+    def query(self, rect):
+        """返回hitbox所在格子与rect相交的物体"""
+        if self.pending_sprites:
+            self.index_pending()
+        return sorted(self.spatial_index.query(rect), key=self.order.__getitem__)
+
+    def add_static(self, hitbox):
+        """添加只有碰撞箱的静态障碍物"""
+        obstacle = StaticHitbox(hitbox)
+        self.order[obstacle] = next(self.counter)
+        self.spatial_index.insert(obstacle, hitbox)
+        return obstacle
+
+    def remove_static(self, obstacle):
+        self.spatial_index.remove(obstacle)
+        del self.order[obstacle]
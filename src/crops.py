@@ -0,0 +1,193 @@
+import numpy as np
+import pygame
+from settings import *
+from sprites import Generic
+from support import import_folder
+
+CROP_TYPES = tuple(GROW_SPEED)  # 作物种类, 数组中用序号表示
+CROP_Y_OFFSET = {'corn': -16, 'tomato': -8}  # 作物底部相对瓦片底部的偏移
+
+
+class CropField:
+    """所有作物的状态, 按struct of arrays存放在numpy数组中
+
+    每株作物占用一个槽位, grid记录每个瓦片上作物的槽位(-1表示空).
+    生长时对所有作物做一次向量化计算, 只返回显示阶段变化了的槽位
+    """
+
+    def __init__(self, width, height, max_stages, soil, capacity=1024):
+        self.grid = np.full((height, width), -1, dtype=np.int32)
+        self.soil = soil  # SoilGrid, 只能种在已开垦的土地上
+        self.speeds = np.array([GROW_SPEED[name] for name in CROP_TYPES], dtype=np.float32)
+        self.max_stages = np.array([max_stages[name] for name in CROP_TYPES], dtype=np.float32)
+
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+        self.stage = np.zeros(capacity, dtype=np.uint8)  # 显示的生长阶段, 即动画帧序号
+        self.age = np.zeros(capacity, dtype=np.float32)
+        self.watered = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.count = 0  # 用过的槽位数, 只计算 [:count]
+        self.free = []  # 被收获的作物留下的空槽位
+
+    def __len__(self):
+        return self.count - len(self.free)
+
+    def grow_capacity(self):
+        for name in ('kind', 'stage', 'age', 'watered', 'alive', 'x', 'y'):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+
+    def plant(self, x, y, name):
+        """在瓦片 (x, y) 种下作物, 没有开垦或已有作物时返回None"""
+        if self.grid[y, x] != -1 or not self.soil.tilled(x, y):
+            return None
+        if self.free:
+            slot = self.free.pop()
+        else:
+            if self.count == len(self.kind):
+                self.grow_capacity()
+            slot = self.count
+            self.count += 1
+        self.kind[slot] = CROP_TYPES.index(name)
+        self.stage[slot] = 0
+        self.age[slot] = 0
+        self.watered[slot] = self.soil.watered(x, y)
+        self.alive[slot] = True
+        self.x[slot], self.y[slot] = x, y
+        self.grid[y, x] = slot
+        return slot
+
+    def remove(self, x, y):
+        slot = self.grid[y, x]
+        if slot == -1:
+            return None
+        self.grid[y, x] = -1
+        self.alive[slot] = False
+        self.free.append(slot)
+        return CROP_TYPES[self.kind[slot]]
+
+    def water(self, x, y):
+        slot = self.grid[y, x]
+        if slot != -1:
+            self.watered[slot] = True
+
+    def grow(self, days=1):
+        """浇过水的作物生长days天, 之后所有作物变干; 返回显示阶段变化了的槽位"""
+        n = self.count
+        kind = self.kind[:n]
+        growing = self.alive[:n] & self.watered[:n]
+        age = self.age[:n]
+        age += np.where(growing, self.speeds[kind] * days, 0)
+        np.minimum(age, self.max_stages[kind], out=age)
+
+        stage = age.astype(np.uint8)
+        changed = np.flatnonzero(stage != self.stage[:n])
+        self.stage[:n] = stage
+        self.watered[:n] = False
+        return changed
+
+    def harvestable(self, x, y):
+        slot = self.grid[y, x]
+        return slot != -1 and self.stage[slot] == self.max_stages[self.kind[slot]]
+
+    def slots_in(self, region):
+        """瓦片范围 (x0, y0, x1, y1) 内的槽位, 行优先顺序"""
+        x0, y0, x1, y1 = region
+        slots = self.grid[y0:y1, x0:x1].ravel()
+        return slots[slots != -1]
+
+
+class CropLayer:
+    """把每个chunk里的作物合成为一张surface, 作为ground plant图层中的一个sprite
+
+    只有已加载的chunk才有surface, 作物状态变化时只重新合成所在的chunk
+    """
+
+    def __init__(self, field, streamer, group):
+        self.field = field
+        self.streamer = streamer
+        self.group = group
+        self.frames = [import_folder(f'assets/graphics/fruit/{name}') for name in CROP_TYPES]
+        self.offsets = [CROP_Y_OFFSET[name] for name in CROP_TYPES]
+        self.sprites = {}  # chunk -> 合成后的sprite
+        self.loaded = set()
+        self.dirty = set()
+
+    def load(self, chunk):
+        self.loaded.add(chunk)
+        self.dirty.add(chunk)
+
+    def unload(self, chunk):
+        self.loaded.discard(chunk)
+        self.dirty.discard(chunk)
+        sprite = self.sprites.pop(chunk, None)
+        if sprite:
+            sprite.kill()
+
+    def changed(self, slots):
+        """标记这些槽位所在的chunk需要重新合成"""
+        field = self.field
+        size = self.streamer.chunk_size
+        chunks = set(zip((field.x[slots] // size).tolist(), (field.y[slots] // size).tolist()))
+        self.dirty.update(chunks & self.loaded)
+
+    def tile_at(self, pos):
+        x, y = int(pos[0]) // TILE_SIZE, int(pos[1]) // TILE_SIZE
+        return (x, y) if self.field.soil.inside(x, y) else None
+
+    def plant(self, pos, name):
+        """在世界坐标pos所在的瓦片上种植"""
+        tile = self.tile_at(pos)
+        if tile:
+            slot = self.field.plant(*tile, name)
+            if slot is not None:
+                self.changed([slot])
+                return True
+        return False
+
+    def harvest(self, rect):
+        """收获rect覆盖的瓦片上成熟的作物, 返回作物名称列表"""
+        field = self.field
+        height, width = field.grid.shape
+        harvested = []
+        for y in range(max(rect.top // TILE_SIZE, 0), min((rect.bottom - 1) // TILE_SIZE + 1, height)):
+            for x in range(max(rect.left // TILE_SIZE, 0), min((rect.right - 1) // TILE_SIZE + 1, width)):
+                if field.harvestable(x, y):
+                    self.changed([field.grid[y, x]])
+                    harvested.append(field.remove(x, y))
+        return harvested
+
+    def water(self, pos):
+        tile = self.tile_at(pos)
+        if tile:
+            self.field.water(*tile)
+
+    def flush(self):
+        for chunk in self.dirty:
+            self.render(chunk)
+        self.dirty.clear()
+
+    def render(self, chunk):
+        field = self.field
+        slots = field.slots_in(self.streamer.tile_region(chunk))
+        sprite = self.sprites.pop(chunk, None)
+        if sprite:
+            sprite.kill()
+        if not len(slots):
+            return
+
+        blits = []
+        for kind, stage, x, y in zip(field.kind[slots].tolist(), field.stage[slots].tolist(),
+                                     field.x[slots].tolist(), field.y[slots].tolist()):
+            surf = self.frames[kind][stage]
+            midbottom = (x * TILE_SIZE + TILE_SIZE // 2, (y + 1) * TILE_SIZE + self.offsets[kind])
+            blits.append((surf, surf.get_rect(midbottom=midbottom)))
+
+        bounds = blits[0][1].unionall([rect for _, rect in blits])
+        chunk_surf = pygame.Surface(bounds.size, pygame.SRCALPHA).convert_alpha()
+        chunk_surf.blits([(surf, rect.move(-bounds.x, -bounds.y)) for surf, rect in blits], False)
+        sprite = Generic(bounds.topleft, chunk_surf, self.group, z=LAYERS['ground plant'])
+        sprite.sprite_type = 'crops'
+        self.sprites[chunk] = sprite
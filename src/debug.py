@@ -0,0 +1,132 @@
+import csv
+import json
+from array import array
+from time import perf_counter
+import pygame
+from settings import *
+
+
+class Profiler:
+    """分阶段计时和计数器, 只保留最近PROFILE_FRAMES帧
+
+    关闭时调用方只做一次 profiler.enabled 判断, 不产生任何额外开销
+    """
+
+    def __init__(self, size=PROFILE_FRAMES):
+        self.size = size
+        self.frame = 0  # 已记录的帧数, 环形缓冲区的写入位置为 frame % size
+        self.phases = {phase: array('d', bytes(8 * size)) for phase in PROFILE_PHASES}
+        self.counters = {counter: array('l', bytes(array('l').itemsize * size)) for counter in PROFILE_COUNTERS}
+        self.current = dict.fromkeys(PROFILE_COUNTERS, 0)  # 当前帧的计数
+
+        # 调试图层, 运行时用DEBUG_KEYS切换
+        self.layers = dict.fromkeys(DEBUG_KEYS.values(), False)
+        self.recording = False  # 不显示HUD也可以记录, 用于导出
+        self.enabled = False
+        self.font = None
+        self.last_time = perf_counter()
+
+    def toggle(self, layer):
+        self.layers[layer] = not self.layers[layer]
+        self.update_enabled()
+
+    def set_recording(self, recording):
+        self.recording = recording
+        self.update_enabled()
+
+    def update_enabled(self):
+        enabled = self.recording or self.layers['hud']
+        if enabled and not self.enabled:
+            self.last_time = perf_counter()  # 第一帧的frame耗时从开始记录时算起
+        self.enabled = enabled
+
+    def handle_key(self, key):
+        if key in DEBUG_KEYS:
+            self.toggle(DEBUG_KEYS[key])
+        elif key == PROFILE_RECORD_KEY:
+            # 不显示HUD时记录, HUD的绘制不计入帧耗时
+            self.set_recording(not self.recording)
+        elif key == PROFILE_EXPORT_KEY:
+            if not self.history():
+                self.set_recording(True)  # 还没有记录任何帧, 先开始记录, 再按一次导出
+                return
+            self.export_csv(PROFILE_EXPORT_PATH + '.csv')
+            self.export_json(PROFILE_EXPORT_PATH + '.json')
+
+    def count(self, counter, amount=1):
+        self.current[counter] += amount
+
+    def end_frame(self, timings):
+        """timings: {phase: 秒}, 写入环形缓冲区并清零当前帧计数"""
+        index = self.frame % self.size
+        now = perf_counter()
+        timings['frame'] = now - self.last_time
+        self.last_time = now
+        for phase, seconds in timings.items():
+            self.phases[phase][index] = seconds * 1000
+        for counter, value in self.current.items():
+            self.counters[counter][index] = value
+            self.current[counter] = 0
+        self.frame += 1
+
+    def history(self):
+        """按时间顺序返回缓冲区中的帧序号"""
+        start = max(0, self.frame - self.size)
+        return range(start, self.frame)
+
+    def averages(self):
+        frames = self.history()
+        if not frames:
+            return {}, {}
+        indices = [frame % self.size for frame in frames]
+        phases = {phase: sum(values[i] for i in indices) / len(indices) for phase, values in self.phases.items()}
+        counters = {counter: sum(values[i] for i in indices) / len(indices) for counter, values in self.counters.items()}
+        return phases, counters
+
+    def rows(self):
+        for frame in self.history():
+            index = frame % self.size
+            row = {'frame': frame}
+            row.update({f'{phase}_ms': values[index] for phase, values in self.phases.items()})
+            row.update({counter: values[index] for counter, values in self.counters.items()})
+            yield row
+
+    def export_csv(self, path):
+        fields = ['frame'] + [f'{phase}_ms' for phase in self.phases] + list(self.counters)
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def export_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(list(self.rows()), file)
+
+    def draw_hud(self, surface):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 24)
+        phases, counters = self.averages()
+        lines = [f'{1000 / phases["frame"]:.0f} fps' if phases.get('frame') else '-- fps']
+        lines += [f'{phase}: {ms:.2f} ms' for phase, ms in phases.items() if phase != 'frame']
+        lines += [f'{counter}: {value:.0f}' for counter, value in counters.items()]
+
+        y = 10
+        for line in lines:
+            text = self.font.render(line, False, 'white', 'black')
+            surface.blit(text, (10, y))
+            y += text.get_height()
+
+
+def draw_hitboxes(surface, player, offset):
+    """红色: 玩家rect边界, 绿色: hitbox碰撞边界, 蓝色: 工具作用点"""
+    offset_rect = player.rect.copy()
+    offset_rect.center -= offset
+    pygame.draw.rect(surface, 'red', offset_rect, 5)
+    hitbox_rect = player.hitbox.copy()
+    hitbox_rect.center = offset_rect.center
+    pygame.draw.rect(surface, 'green', hitbox_rect, 5)
+    target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
+    pygame.draw.circle(surface, 'blue', target_pos, 5)
+
+
+profiler = Profiler()
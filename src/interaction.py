@@ -0,0 +1,28 @@
+from settings import *
+from spatial import SpatialGrid
+
+
+class InteractionIndex:
+    """世界坐标点 -> 该点上可以交互的对象, 按瓦片建立索引
+
+    树等对象按rect登记在覆盖的每个瓦片上, 查询只看目标点所在的一个瓦片.
+    土地和作物本身就是按瓦片存放的数组(SoilGrid.flags, CropField.grid), 工具直接按瓦片坐标查询
+    """
+
+    def __init__(self):
+        self.cells = SpatialGrid(TILE_SIZE)
+        self.kinds = {}  # 对象 -> 种类
+
+    def add(self, item, kind):
+        self.kinds[item] = kind
+        self.cells.insert(item, item.rect)
+
+    def remove(self, item):
+        if self.kinds.pop(item, None) is not None:
+            self.cells.remove(item)
+
+    def at(self, pos, kind):
+        """pos处rect包含pos的kind类对象"""
+        kinds = self.kinds
+        return [item for item in self.cells.query_point(pos)
+                if kinds[item] == kind and item.rect.collidepoint(pos)]
@@ -1,75 +1,130 @@
+import weakref
 import pygame
+from contextlib import nullcontext
+from random import random
+from itertools import chain
 from settings import *
 from player import Player
 from overlay import Overlay
-from sprites import Generic, Water, Tree
-from pytmx import load_pygame
+from sprites import Generic, Water, Tree, default_hitbox
 from sprites import WildFlower
-from support import import_folder
+from support import import_folder, bake_tiles
+from spatial import SpatialGrid
+from render import RenderQueue, DirtyRenderer, ScaledTarget, is_dynamic
+from collision import CollisionGroup, solid_tile_rects
+from resources import registry, folder_images
+from levelcache import load_level
+from debug import profiler, draw_hitboxes
+from timer import Scheduler, Timer
+from animation import AnimationClocks
+from streaming import ChunkStreamer
+from crops import CropField, CropLayer, CROP_TYPES
+from soil import SoilGrid, SoilLayer, AUTOTILE
+from rain import Rain
+from interaction import InteractionIndex
+from replay import ReplayKeys
+from navigation import NavGrid, FlowFieldCache, AgentGroup
+from time import perf_counter
 
 
 class Level:
-    def __init__(self):
+    def __init__(self, progress=None, level_data=None, seed=None, headless=False):
         # get the display surface
         self.display_surface = pygame.display.get_surface()
+        self.level_data = level_data  # 默认读取MAP_PATH, 基准测试会传入放大后的地图
+
+        # 无窗口模拟: 只建立影响游戏逻辑的对象(树、苹果、碰撞、玩家、定时器), 不创建纯显示用的sprite.
+        # 图片只读取尺寸, 不需要显示器; 只在这个Level加载图片时使用SurfaceStub, 见assets()
+        self.headless = headless
+        self.day = 0
 
         # sprite groups
         self.all_sprites = CameraGroup()
-        self.collision_sprites = pygame.sprite.Group()  # 所有需要碰撞的物体
+        self.collision_sprites = CollisionGroup()  # 所有需要碰撞的物体, 按hitbox建立空间索引
         self.tree_sprites = pygame.sprite.Group()
+        self.interactions = InteractionIndex()  # 工具目标, 按瓦片查询
+
+        # 定时器统一由scheduler管理, 使用模拟时间(毫秒), 不受真实时间和帧率影响
+        self.time = 0
+        self.scheduler = Scheduler(clock=lambda: self.time)
+        self.animation_clocks = AnimationClocks()  # 同类动画瓦片共享一个时钟
+
+        # 先并行解码所有图片, progress(done, total)用于显示加载进度
+        atlas_images = (folder_images('assets/graphics/character')
+                        + folder_images('assets/graphics/stumps')
+                        + folder_images('assets/graphics/overlay')
+                        + [path for name in CROP_TYPES for path in folder_images(f'assets/graphics/fruit/{name}')]
+                        + [f'assets/graphics/soil/{name}.png' for name in AUTOTILE.values()]
+                        + folder_images('assets/graphics/soil_water')
+                        + folder_images('assets/graphics/rain/drops')
+                        + folder_images('assets/graphics/rain/floor')
+                        + ['assets/graphics/fruit/apple.png'])
+        if not headless:
+            registry.preload(atlas_images
+                             + folder_images('assets/graphics/water')
+                             + ['assets/graphics/world/ground.png'],
+                             progress)
 
-        self.setup()
-        self.overlay = Overlay(self.player)
+            # 把反复使用的小图打包进图集, 必须在创建sprite之前
+            registry.build_atlas('sprites', atlas_images)
+
+        with self.assets():
+            self.setup()
+            self.overlay = Overlay(self.player)
+
+            # 天气, 雨滴不是sprite, 在对应图层的sprite之后绘制
+            self.rain = Rain(seed)
+        self.all_sprites.layer_renderers = {LAYERS['rain floor']: self.rain.draw_floor,
+                                            LAYERS['rain drops']: self.rain.draw_drops}
+        self.dirty_rendering = DIRTY_RENDERING  # 局部重绘模式, 可在运行时切换
+
+    def assets(self):
+        """加载图片时使用的上下文: 无窗口时registry只返回SurfaceStub"""
+        return registry.stubbed() if self.headless else nullcontext()
 
     def setup(self):
-        tmx_data = load_pygame('assets/data/map.tmx')
-
-        # house
-        for layer in ['HouseFloor', 'HouseFurnitureBottom']:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-                Generic((x * TILE_SIZE, y * TILE_SIZE),
-                        surf,
-                        self.all_sprites,
-                        z=LAYERS['house bottom']
-                        ).sprite_type = 'house'
-        for layer in ['HouseWalls', 'HouseFurnitureTop']:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-                Generic((x * TILE_SIZE, y * TILE_SIZE),
-                        surf,
-                        self.all_sprites,
-                        z=LAYERS['main']
-                        ).sprite_type = 'house'
-
-        # fence
-        for x, y, surf in tmx_data.get_layer_by_name('Fence').tiles():
-            Generic((x * TILE_SIZE, y * TILE_SIZE),
-                    surf,
-                    [self.all_sprites, self.collision_sprites],
-                    z=LAYERS['main']
-                    ).sprite_type = 'fence'
+        tmx_data = self.level_data or load_level(MAP_PATH, headless=self.headless)
+        self.tmx_data = tmx_data
 
-        # water
-        water_frames = import_folder('assets/graphics/water')
-        for x, y, surf in tmx_data.get_layer_by_name('Water').tiles():
-            Water((x * TILE_SIZE, y * TILE_SIZE), water_frames, self.all_sprites)
+        # 世界按chunk加载, 这里只建立索引, sprite在玩家靠近时才创建
+        self.streamer = ChunkStreamer(tmx_data.width, tmx_data.height, self.load_chunk, self.unload_chunk)
+        self.tree_states = {}  # 卸载时保存的树的状态, MapObject -> Tree.save_state()
+        self.tree_objects = {}  # 已加载的Tree -> 对应的MapObject
+        self.baked_strips = weakref.WeakValueDictionary()  # 像素相同的行条带共用一个surface, 卸载后自动释放
 
-        # trees
+        # 对象按左上角所在的chunk分组
+        self.chunk_objects = {}
+        for layer in ('Trees', 'Decoration'):
+            for obj in tmx_data.get_layer_by_name(layer):
+                self.chunk_objects.setdefault(self.streamer.chunk_at(obj.x, obj.y), []).append((layer, obj))
+
+        # collision tiles, 先在整张地图上合并, 每个矩形由与它相交的所有chunk共享
+        collision_tiles = [(x, y) for x, y, _ in tmx_data.get_layer_by_name('Collision').tiles()]
+        self.collision_rects = solid_tile_rects(collision_tiles, tmx_data.width, tmx_data.height)
+        self.chunk_collision = {}
+        for index, rect in enumerate(self.collision_rects):
+            for chunk in self.streamer.chunks_in(rect):
+                self.chunk_collision.setdefault(chunk, []).append(index)
+
+        # navigation, 整张地图的可通行网格: 碰撞图层、栅栏和树的碰撞箱
+        self.nav_grid = NavGrid(tmx_data.width, tmx_data.height)
+        self.nav_grid.block_tiles(collision_tiles)
+        self.nav_grid.block_tiles((x, y) for x, y, _ in tmx_data.get_layer_by_name('Fence').tiles())
         for obj in tmx_data.get_layer_by_name('Trees'):
-            Tree(pos=(obj.x, obj.y),
-                 surf=obj.image,
-                 groups=[self.all_sprites, self.collision_sprites, self.tree_sprites],
-                 name=obj.name)
+            self.nav_grid.set_obstacle(obj, default_hitbox(obj.image.get_rect(topleft=(obj.x, obj.y))))
+        self.flow_fields = FlowFieldCache(self.nav_grid)
+        self.agent_groups = []
 
-        # wildflowers
-        for obj in tmx_data.get_layer_by_name('Decoration'):
-            WildFlower(pos=(obj.x, obj.y), surf=obj.image, groups=[self.all_sprites, self.collision_sprites])
+        # soil, 只有Farmable图层标记的瓦片可以开垦
+        self.soil_grid = SoilGrid(tmx_data.get_layer_by_name('Farmable').gids != 0)
+        self.soil_layer = SoilLayer(self.soil_grid, self.streamer, self.all_sprites)
 
-        # collision tiles
-        for x, y, surf in tmx_data.get_layer_by_name('Collision').tiles():
-            Generic((x * TILE_SIZE, y * TILE_SIZE),
-                    pygame.Surface((TILE_SIZE, TILE_SIZE)),
-                    self.collision_sprites
-                    ).sprite_type = 'collision'
+        # crops, 种在已开垦的土地上
+        max_stages = {name: len(folder_images(f'assets/graphics/fruit/{name}')) - 1 for name in CROP_TYPES}
+        self.crop_field = CropField(tmx_data.width, tmx_data.height, max_stages, self.soil_grid)
+        self.crop_layer = CropLayer(self.crop_field, self.streamer, self.all_sprites)
+        self.day_timer = Timer(DAY_LENGTH, self.new_day, scheduler=self.scheduler)
+        self.day_timer.activate()
 
         # player
         for obj in tmx_data.get_layer_by_name('Player'):
@@ -77,22 +132,239 @@ class Level:
                 self.player = Player(pos=(obj.x, obj.y),
                                      groups=self.all_sprites,
                                      collision_sprites=self.collision_sprites,
-                                     tree_sprites=self.tree_sprites)
-
-        # ground
-        Generic(
-            pos=(0, 0),
-            surf=pygame.image.load('assets/graphics/world/ground.png').convert_alpha(),
-            groups=self.all_sprites,
-            z=LAYERS['ground']
-        )
-
-    def run(self, dt):
-        self.display_surface.fill('black')
-        self.all_sprites.customize_draw(self.player)
+                                     interactions=self.interactions,
+                                     soil_layer=self.soil_layer,
+                                     crop_layer=self.crop_layer,
+                                     scheduler=self.scheduler)
+                if self.headless:
+                    self.player.key_source = ReplayKeys()  # 没有键盘, 由调用方直接操作玩家
+
+        self.water_clock = self.animation_clocks.get('water', import_folder('assets/graphics/water'),
+                                                     WATER_ANIMATION_SPEED)
+        self.ground_surf = registry.load('assets/graphics/world/ground.png')
+        self.streamer.update(self.player.rect.center)
+
+    def load_chunk(self, chunk):
+        """创建chunk内的所有sprite并返回, 卸载时由unload_chunk销毁"""
+        sprites = self.create_chunk_sprites(chunk)
+        # chunk在玩家之后才加载, 用类别而不是加入顺序决定相同centery时的绘制先后
+        for sprite in sprites:
+            sprite.draw_order = MAP_DRAW_ORDER.index(sprite.sprite_type.split('_')[0])
+        return sprites
+
+    def create_chunk_sprites(self, chunk):
+        tmx_data = self.tmx_data
+        region = self.streamer.tile_region(chunk)
+        sprites = []
+
+        def tiles(*names):
+            return chain.from_iterable(tmx_data.get_layer_by_name(name).tiles(region) for name in names)
+
+        # fence的碰撞按瓦片
+        fence_tiles = list(tiles('Fence'))
+        for x, y, surf in fence_tiles:
+            sprites.append(Generic((x * TILE_SIZE, y * TILE_SIZE), surf, self.collision_sprites))
+            sprites[-1].sprite_type = 'fence'
+
+        # trees, 之前加载过的树恢复保存的状态
+        for layer, obj in self.chunk_objects.get(chunk, ()):
+            if layer == 'Trees':
+                tree = Tree(pos=(obj.x, obj.y),
+                            surf=obj.image,
+                            groups=[self.all_sprites, self.collision_sprites, self.tree_sprites],
+                            name=obj.name,
+                            scheduler=self.scheduler,
+                            player_add=self.player_add,
+                            on_fell=self.tree_felled,
+                            state=self.tree_states.pop(obj, None))
+                self.tree_objects[tree] = obj
+                if tree.alive:
+                    self.interactions.add(tree, 'tree')
+                sprites.append(tree)
+
+        # wildflowers
+        for layer, obj in self.chunk_objects.get(chunk, ()):
+            if layer == 'Decoration':
+                sprites.append(WildFlower(pos=(obj.x, obj.y), surf=obj.image,
+                                          groups=[self.all_sprites, self.collision_sprites]))
+
+        # 共享对象: 合并后的碰撞箱和平铺的地面可能跨越多个chunk
+        for index in self.chunk_collision.get(chunk, ()):
+            self.streamer.acquire(('collision', index),
+                                  lambda: self.collision_sprites.add_static(self.collision_rects[index]))
+        if self.headless:
+            return sprites
+
+        # 以下只影响显示
+        # house, 静态瓦片合成为chunk, 墙和高家具切成行条带以便与玩家y排序
+        for pos, surf in bake_tiles(tiles('HouseFloor', 'HouseFurnitureBottom')):
+            sprites.append(Generic(pos, surf, self.all_sprites, z=LAYERS['house bottom']))
+            sprites[-1].sprite_type = 'house'
+        for pos, surf in bake_tiles(tiles('HouseWalls', 'HouseFurnitureTop'), row_strips=True,
+                                    shared=self.baked_strips):
+            sprites.append(Generic(pos, surf, self.all_sprites, z=LAYERS['main']))
+            sprites[-1].sprite_type = 'house'
+
+        # fence, 绘制用行条带
+        for pos, surf in bake_tiles(fence_tiles, row_strips=True, shared=self.baked_strips):
+            sprites.append(Generic(pos, surf, self.all_sprites, z=LAYERS['main']))
+            sprites[-1].sprite_type = 'fence'
+
+        # water
+        for x, y, surf in tiles('Water'):
+            sprites.append(Water((x * TILE_SIZE, y * TILE_SIZE), self.water_clock, self.all_sprites))
+
+        self.soil_layer.load(chunk)
+        self.crop_layer.load(chunk)
+        for pos in self.ground_tiles(chunk):
+            self.streamer.acquire(('ground', pos),
+                                  lambda: Generic(pos=pos, surf=self.ground_surf, groups=self.all_sprites,
+                                                  z=LAYERS['ground']))
+        return sprites
+
+    def unload_chunk(self, chunk, sprites):
+        for sprite in sprites:
+            if sprite in self.tree_objects:
+                self.tree_states[self.tree_objects.pop(sprite)] = sprite.save_state()
+                self.interactions.remove(sprite)
+                for apple in sprite.apple_sprites.sprites():
+                    apple.kill()
+            sprite.kill()
+        self.soil_layer.unload(chunk)
+        self.crop_layer.unload(chunk)
+        for index in self.chunk_collision.get(chunk, ()):
+            self.streamer.release(('collision', index), self.collision_sprites.remove_static)
+        if self.headless:
+            return
+        for pos in self.ground_tiles(chunk):
+            self.streamer.release(('ground', pos), pygame.sprite.Sprite.kill)
+
+    def tree_felled(self, tree):
+        """树桩的碰撞箱和树不同, 变化的瓦片更新到缓存的flow field"""
+        freed, blocked = self.nav_grid.set_obstacle(self.tree_objects[tree], tree.hitbox)
+        self.flow_fields.update(freed, blocked)
+
+    def goal_tiles(self, kind):
+        """agent的目标瓦片: 'house' 屋内地板, 'water' 水边, 'trees' 没被砍倒的树旁边"""
+        grid = self.nav_grid
+        if kind == 'house':
+            return {(x, y) for x, y, _ in self.tmx_data.get_layer_by_name('HouseFloor').tiles()
+                    if grid.walkable(x, y)}
+        if kind == 'water':
+            return grid.around((x, y, x + 1, y + 1) for x, y, _ in self.tmx_data.get_layer_by_name('Water').tiles())
+        if kind == 'trees':
+            felled = {obj for tree, obj in self.tree_objects.items() if not tree.alive}
+            felled.update(obj for obj, state in self.tree_states.items() if state['health'] <= 0)
+            return grid.around(region for obj, region in grid.obstacles.items() if obj not in felled)
+        raise ValueError(f'unknown goal {kind!r}')
+
+    def send_agents(self, positions, kind):
+        """让一组agent走向kind类型的目标, 同一目标的agent共用一个flow field
+
+        全部到达后自动从agent_groups中移除, 返回的组仍可读取最终位置
+        """
+        group = AgentGroup(self.goal_tiles(kind), positions)
+        self.agent_groups.append(group)
+        return group
+
+    def player_add(self, item):
+        self.player.item_inventory[item] += 1
+
+    def harvest(self, rect):
+        """收获rect覆盖的瓦片上成熟的作物"""
+        for name in self.crop_layer.harvest(rect):
+            self.player_add(name)
+
+    def new_day(self):
+        self.day += 1
+
+        # 所有作物一次向量化生长, 只重新合成显示阶段变化的chunk
+        self.crop_layer.changed(self.crop_field.grow())
+        self.soil_layer.dry()
+        self.rain.raining = random() < RAIN_CHANCE
+
+        # 没被砍倒的树重新结果, 未加载的树在下次加载时重新生成
+        for tree in self.tree_objects:
+            if tree.alive:
+                for apple in tree.apple_sprites.sprites():
+                    apple.kill()
+                tree.create_apple()
+        for state in self.tree_states.values():
+            state['apples'] = None
+        self.day_timer.activate()
+
+    def ground_tiles(self, chunk):
+        """与chunk相交的地面图片位置, 地图比地面图片大时平铺"""
+        width, height = self.ground_surf.get_size()
+        x0, y0, x1, y1 = (value * TILE_SIZE for value in self.streamer.tile_region(chunk))
+        x1 = min(x1, self.tmx_data.width * TILE_SIZE)
+        y1 = min(y1, self.tmx_data.height * TILE_SIZE)
+        return [(x, y) for x in range(x0 // width * width, x1, width)
+                for y in range(y0 // height * height, y1, height)]
+
+    def draw(self, alpha=1.0):
+        """返回需要提交到显示器的区域, None表示整屏"""
+        # 调试图层画在整个屏幕上, 下雨时整个画面都在变化, 这两种情况不使用局部重绘
+        # 缩放渲染时每帧都要整体放大, 也不使用
+        if (self.dirty_rendering and not self.rain.active and self.all_sprites.render_scale == 1
+                and not (profiler.layers['hud'] or profiler.layers['hitboxes'])):
+            return self.all_sprites.customize_draw(self.player, alpha, self.overlay.rects())
+        self.all_sprites.customize_draw(self.player, alpha)
+        return None
+
+    def cycle_render_scale(self):
+        """切换到RENDER_SCALES中的下一个渲染比例"""
+        scales = RENDER_SCALES
+        current = self.all_sprites.render_scale
+        index = scales.index(current) + 1 if current in scales else 0
+        self.all_sprites.render_scale = scales[index % len(scales)]
+
+    def update(self, dt):
+        self.time += dt * 1000
+        with self.assets():
+            self.streamer.update(self.player.rect.center)
+        self.scheduler.update()
+        self.animation_clocks.update(dt)
+        self.all_sprites.store_previous()  # 记录更新前的位置, 绘制时用于插值
         self.all_sprites.update(dt)
+        self.harvest(self.player.hitbox)
+        for group in self.agent_groups:
+            group.update(self.flow_fields.get(group.goals), dt)
+        # 全部到达(或无法到达)的组不再更新
+        self.agent_groups = [group for group in self.agent_groups if not group.finished]
+        if not self.headless:
+            self.crop_layer.flush()
+            self.rain.update(dt, self.all_sprites.camera_rect())
+
+    def run(self, dt, steps=1, alpha=1.0):
+        """推进steps次模拟(每次dt秒)后绘制一帧
+
+        固定步长模式下一帧可能不更新或更新多次, alpha为上一次与本次模拟之间的插值系数
+        """
+        if profiler.enabled:
+            return self.run_profiled(dt, steps, alpha)
+
+        for _ in range(steps):
+            self.update(dt)
+        dirty_rects = self.draw(alpha)
 
         self.overlay.display()
+        return dirty_rects
+
+    def run_profiled(self, dt, steps, alpha):
+        # 与run相同, 额外记录每个阶段的耗时
+        start = perf_counter()
+        for _ in range(steps):
+            self.update(dt)
+        updated = perf_counter()
+        dirty_rects = self.draw(alpha)
+        drawn = perf_counter()
+        self.overlay.display()
+        profiler.end_frame({'draw': drawn - updated, 'update': updated - start, 'overlay': perf_counter() - drawn})
+
+        if profiler.layers['hud']:
+            profiler.draw_hud(self.display_surface)
+        return dirty_rects
 
 
 class CameraGroup(pygame.sprite.Group):
@@ -101,54 +373,135 @@ class CameraGroup(pygame.sprite.Group):
         self.display_surface = pygame.display.get_surface()
         self.offset = pygame.math.Vector2()
 
-    def customize_draw(self, player):
+        # 空间索引, 只绘制与摄像机范围相交的sprite
+        self.spatial_index = SpatialGrid(TILE_SIZE)
+        self.render_queue = RenderQueue()  # 按图层分桶, 桶内按centery有序
+        self.pending_sprites = {}  # sprite加入组时还没有rect, 延迟到下一帧再建立索引
+        self.moving_sprites = {}  # 会移动的sprite -> 上一次模拟后的center, 用于插值绘制
+        self.updating_sprites = {}  # 重写了update的sprite, 其余sprite每帧不调用update
+        self.dynamic_sprites = {}  # 位置或图像会变化的sprite, 局部重绘时需要跟踪
+        self.layer_renderers = {}  # 图层 -> 在该图层sprite之后调用的绘制函数(例如雨)
+        self.dirty_renderer = DirtyRenderer(self.render_queue, self.spatial_index)
+
+        # 渲染缩放, 每个比例的离屏surface和缩放后的图像只创建一次
+        self.render_scale = RENDER_SCALE
+        self.scaled_targets = {}
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.pending_sprites[sprite] = None
+        if type(sprite).update is not pygame.sprite.Sprite.update:
+            self.updating_sprites[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.pending_sprites.pop(sprite, None)
+        self.spatial_index.remove(sprite)
+        self.render_queue.remove(sprite)
+        self.moving_sprites.pop(sprite, None)
+        self.updating_sprites.pop(sprite, None)
+        if self.dynamic_sprites.pop(sprite, 0) is None:
+            self.dirty_renderer.forget(sprite)
+        else:
+            self.dirty_renderer.invalidate()
+
+    def index_pending(self):
+        for sprite in self.pending_sprites:
+            self.spatial_index.insert(sprite, sprite.rect)
+            self.render_queue.add(sprite)
+            if getattr(sprite, 'movable', False):
+                self.moving_sprites[sprite] = None
+            if is_dynamic(sprite):
+                self.dynamic_sprites[sprite] = None
+            else:
+                self.dirty_renderer.invalidate()  # 静态内容变化, 背景缓存失效
+        self.pending_sprites.clear()
+
+    def refresh(self, sprite):
+        """sprite的rect被外部修改后调用, 同步空间索引和绘制顺序"""
+        if sprite in self.spatial_index:
+            self.spatial_index.move(sprite, sprite.rect)
+            self.render_queue.reorder(sprite)
+            if sprite not in self.dynamic_sprites:
+                self.dirty_renderer.invalidate()
+                # 静态sprite的图像可能被原地修改(土地), 缩放后的副本需要重建
+                for target in self.scaled_targets.values():
+                    target.discard(sprite.image)
+
+    def update(self, *args, **kwargs):
+        for sprite in list(self.updating_sprites):
+            sprite.update(*args, **kwargs)
+        self.index_pending()
+        for sprite in self.moving_sprites:
+            self.refresh(sprite)
+
+    def store_previous(self):
+        for sprite in self.moving_sprites:
+            self.moving_sprites[sprite] = sprite.rect.center
+
+    def interpolated_rects(self, alpha):
+        """移动中的sprite在上一次与本次模拟位置之间插值后的rect"""
+        rects = {}
+        for sprite, previous in self.moving_sprites.items():
+            if previous is not None and previous != sprite.rect.center:
+                rect = sprite.rect.copy()
+                rect.center = (round(previous[0] + (rect.centerx - previous[0]) * alpha),
+                               round(previous[1] + (rect.centery - previous[1]) * alpha))
+                rects[sprite] = rect
+        return rects
+
+    def camera_rect(self):
+        """摄像机在世界坐标中的范围(含边距)"""
+        camera_rect = pygame.Rect(self.offset.x, self.offset.y, SCREEN_WIDTH, SCREEN_HEIGHT)
+        return camera_rect.inflate(CULL_MARGIN * 2, CULL_MARGIN * 2)
+
+    def customize_draw(self, player, alpha=1.0, dirty_rects=None):
+        """dirty_rects为None时整屏绘制; 否则使用局部重绘, 这些额外的屏幕区域(界面)也会被恢复
+
+        返回需要提交到显示器的区域, None表示整屏
+        """
+        rects = self.interpolated_rects(alpha) if alpha < 1 else {}
+        player_rect = rects.get(player, player.rect)
+
         # 计算camera与player的偏移
-        self.offset.x = player.rect.centerx - SCREEN_WIDTH / 2
-        self.offset.y = player.rect.centery - SCREEN_HEIGHT / 2
-
-        # 打印所有sprite的类别信息
-        for sprite in self.sprites():
-            sprite.print_sprite_info()
-
-        # 按图层绘制, 高图层会覆盖低图层
-        for layer in LAYERS.values():
-            for sprite in sorted(self.sprites(), key=lambda sprite: sprite.rect.centery):
-                if sprite.z == layer:
-                    offset_rect = sprite.rect.copy()  # offset仅用于视觉效果, 不改变世界坐标系中实际位置
-                    offset_rect.center -= self.offset
-                    self.display_surface.blit(sprite.image, offset_rect)
-
-                    # # 详细调试苹果
-                    # if hasattr(sprite, 'apple_sprites'):
-                    #     print(f"Drawing tree with {len(sprite.apple_sprites.sprites())} apples")  # 输出苹果总数
-                    #     for apple in sprite.apple_sprites.sprites():
-                    #         apple_rect = apple.rect.copy()
-                    #         apple_offset_rect = apple_rect.copy()
-                    #         apple_offset_rect.center -= self.offset
-                    #
-                    #         # 检查苹果是否在屏幕内并输出结果
-                    #         screen_rect = self.display_surface.get_rect()
-                    #         is_on_screen = screen_rect.colliderect(apple_offset_rect)
-                    #         print(f"Apple at {apple.rect.center} - On screen: {is_on_screen}")  # 输出每个苹果的位置和是否在屏幕内
-
-                    # # 红色:玩家rect边界, 绿色: hitbox碰撞边界, 蓝色: 工具作用点
-                    # if sprite == player and layer == LAYERS['main']:
-                    #     print(f'enter {sprite.__str__()}')
-                    #     pygame.draw.rect(self.display_surface, 'red', offset_rect, 5)
-                    #     hitbox_rect = player.hitbox.copy()
-                    #     hitbox_rect.center = offset_rect.center
-                    #     pygame.draw.rect(self.display_surface, 'green', hitbox_rect, 5)
-                    #     target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
-                    #     pygame.draw.circle(self.display_surface, 'blue', target_pos, 5)
-
-        # 玩家边界
-        offset_rect = player.rect.copy()
-        offset_rect.center -= self.offset
-        pygame.draw.rect(self.display_surface, 'red', offset_rect, 5)
-        # 碰撞箱
-        hitbox_rect = player.hitbox.copy()
-        hitbox_rect.center = offset_rect.center
-        pygame.draw.rect(self.display_surface, 'green', hitbox_rect, 5)
-        # 工具目标点
-        target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
-        pygame.draw.circle(self.display_surface, 'blue', target_pos, 5)
+        self.offset.x = player_rect.centerx - SCREEN_WIDTH / 2
+        self.offset.y = player_rect.centery - SCREEN_HEIGHT / 2
+        self.index_pending()
+        view_rect = self.camera_rect()
+        visible_sprites = self.spatial_index.query(view_rect)
+
+        # 调试: 打印可见sprite的类别信息
+        if profiler.layers['trace']:
+            for sprite in visible_sprites:
+                sprite.print_sprite_info()
+
+        if dirty_rects is not None:
+            dirty = self.dirty_renderer.draw(self.display_surface, self.offset, view_rect, visible_sprites,
+                                             self.dynamic_sprites, rects, dirty_rects)
+            if profiler.enabled:
+                # 局部重绘时没有重画的sprite也算作剔除
+                profiler.count('sprites drawn', self.dirty_renderer.sprites_drawn)
+                profiler.count('sprites culled', len(self) - self.dirty_renderer.sprites_drawn)
+            return dirty
+
+        # 按图层绘制, 高图层会覆盖低图层; 同层内按centery排序, 已由render_queue增量维护
+        self.dirty_renderer.invalidate()
+        if self.render_scale == 1:
+            self.display_surface.fill('black')
+            drawn = self.render_queue.draw(self.display_surface, self.offset, view_rect, visible_sprites, rects,
+                                           renderers=self.layer_renderers)
+        else:
+            target = self.scaled_targets.get(self.render_scale)
+            if target is None:
+                target = self.scaled_targets[self.render_scale] = ScaledTarget(self.render_scale)
+            target.surface.fill('black')
+            drawn = self.render_queue.draw(target.surface, self.offset, view_rect, visible_sprites, rects,
+                                           renderers=self.layer_renderers, scaler=target)
+            target.present(self.display_surface)
+        if profiler.enabled:
+            profiler.count('sprites drawn', drawn)
+            profiler.count('sprites culled', len(self) - drawn)
+
+        # 调试: 玩家边界、碰撞箱和工具目标点
+        if profiler.layers['hitboxes']:
+            draw_hitboxes(self.display_surface, player, self.offset)
@@ -0,0 +1,219 @@
+import json
+import os
+import struct
+import xml.etree.ElementTree as ElementTree
+import numpy as np
+import pygame
+from settings import *
+from resources import pack_surfaces, fingerprint, same_pixels, SurfaceStub
+
+# 文件格式: MAGIC | 版本(u32) | 头部长度(u32) | 头部json | 各图层gid数组(uint16) | 图集RGBA像素
+MAGIC = b'SLVL'
+VERSION = 2
+PREFIX = struct.Struct('<4sII')
+
+
+class TileLayer:
+    def __init__(self, name, gids, images):
+        self.name = name
+        self.gids = gids  # (height, width) 的uint16数组, 0表示空
+        self.images = images
+
+    def tiles(self, region=None):
+        """与pytmx相同, 按行优先顺序返回 (x, y, surf)
+
+        region为 (x0, y0, x1, y1) 时只返回该范围内的瓦片
+        """
+        x0, y0, x1, y1 = region or (0, 0, self.gids.shape[1], self.gids.shape[0])
+        gids = self.gids[y0:y1, x0:x1]
+        images = self.images
+        for y, x in zip(*np.nonzero(gids)):
+            yield int(x) + x0, int(y) + y0, images[gids[y, x]]
+
+
+class MapObject:
+    __slots__ = ('x', 'y', 'name', 'image')
+
+    def __init__(self, x, y, name, image):
+        self.x = x
+        self.y = y
+        self.name = name
+        self.image = image
+
+
+class ObjectLayer(list):
+    def __init__(self, name, objects):
+        super().__init__(objects)
+        self.name = name
+
+
+class LevelData:
+    """编译后的关卡, 提供Level.setup用到的那部分pytmx接口"""
+
+    def __init__(self, width, height, layers):
+        self.width = width
+        self.height = height
+        self.layers = {layer.name: layer for layer in layers}
+
+    def get_layer_by_name(self, name):
+        return self.layers[name]
+
+    def tiled(self, columns, rows, unique_layers=('Player',)):
+        """把地图平铺 columns x rows 次, 用于生成放大的测试地图
+
+        unique_layers中的对象(例如玩家出生点)只保留一份
+        """
+        span_x, span_y = self.width * TILE_SIZE, self.height * TILE_SIZE
+        layers = []
+        for layer in self.layers.values():
+            if isinstance(layer, TileLayer):
+                layers.append(TileLayer(layer.name, np.tile(layer.gids, (rows, columns)), layer.images))
+            elif layer.name in unique_layers:
+                layers.append(layer)
+            else:
+                layers.append(ObjectLayer(layer.name, [
+                    MapObject(obj.x + column * span_x, obj.y + row * span_y, obj.name, obj.image)
+                    for row in range(rows) for column in range(columns) for obj in layer]))
+        return LevelData(self.width * columns, self.height * rows, layers)
+
+
+def source_files(tmx_path):
+    """tmx文件以及它引用的所有tsx和图片, 任何一个变化都会使缓存失效"""
+    files = [tmx_path]
+    for tileset in ElementTree.parse(tmx_path).getroot().iter('tileset'):
+        if 'source' not in tileset.attrib:
+            continue
+        tsx_path = os.path.normpath(os.path.join(os.path.dirname(tmx_path), tileset.attrib['source']))
+        files.append(tsx_path)
+        for image in ElementTree.parse(tsx_path).getroot().iter('image'):
+            files.append(os.path.normpath(os.path.join(os.path.dirname(tsx_path), image.attrib['source'])))
+    return files
+
+
+def signature(paths):
+    """每个文件的 [路径, mtime, 大小], 只需要stat, 不解析文件
+
+    tmx中引用的tsx列表变化时tmx本身也会变化, 所以读取缓存时检查头部记录的文件列表即可
+    """
+    result = []
+    for path in paths:
+        stat = os.stat(path)
+        result.append([path.replace('\\', '/'), stat.st_mtime_ns, stat.st_size])
+    return result
+
+
+def compile_level(tmx_path, cache_path):
+    """用pytmx解析一次tmx, 把图层、对象和打包后的图块写入缓存文件"""
+    from pytmx import load_pygame, TiledTileLayer, TiledObjectGroup
+    tmx_data = load_pygame(tmx_path)
+
+    # 所有用到的图块和对象图片, 按像素内容去重后编号, 0保留为空.
+    # pytmx为每个gid创建单独的surface, 不同图块集中相同的图块也只保存一份
+    surfaces = []
+    indices = {}  # id(surf) -> 编号
+    contents = {}  # fingerprint -> 编号
+
+    def image_index(surf):
+        if surf is None:
+            return 0
+        if id(surf) not in indices:
+            key = fingerprint(surf)
+            index = contents.get(key)
+            if index is None or not same_pixels(surfaces[index - 1], surf):
+                surfaces.append(surf)
+                index = len(surfaces)
+                contents.setdefault(key, index)
+            indices[id(surf)] = index
+        return indices[id(surf)]
+
+    tile_layers = []
+    gid_blocks = []
+    object_layers = []
+    for layer in tmx_data.layers:
+        if isinstance(layer, TiledTileLayer):
+            gids = np.zeros((tmx_data.height, tmx_data.width), dtype='<u2')
+            for x, y, surf in layer.tiles():
+                gids[y, x] = image_index(surf)
+            tile_layers.append(layer.name)
+            gid_blocks.append(gids.tobytes())
+        elif isinstance(layer, TiledObjectGroup):
+            object_layers.append({
+                'name': layer.name,
+                'objects': [[obj.x, obj.y, obj.name, image_index(obj.image)] for obj in layer],
+            })
+
+    atlas, rects = pack_surfaces(surfaces)
+    header = json.dumps({
+        'signature': signature(source_files(tmx_path)),
+        'width': tmx_data.width,
+        'height': tmx_data.height,
+        'tile_layers': tile_layers,
+        'object_layers': object_layers,
+        'images': [list(rect) for rect in rects],
+        'atlas_size': list(atlas.get_size()),
+    }).encode('utf-8')
+
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        file.write(header)
+        for block in gid_blocks:
+            file.write(block)
+        file.write(pygame.image.tobytes(atlas, 'RGBA'))
+    os.replace(temp_path, cache_path)  # 写完整后再替换, 中途退出不会留下损坏的缓存
+
+
+def read_level(tmx_path, cache_path, headless=False):
+    """一次读入整个缓存文件, 缓存不存在、版本不同、文件不完整或源文件变化时返回None
+
+    headless为True时不解码图集, 图块只有尺寸(SurfaceStub)
+    """
+    try:
+        with open(cache_path, 'rb') as file:
+            data = file.read()
+        magic, version, header_length = PREFIX.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            return None
+        header = json.loads(data[PREFIX.size:PREFIX.size + header_length])
+        paths = [path for path, _, _ in header['signature']]
+        if not paths or paths[0] != tmx_path.replace('\\', '/') or header['signature'] != signature(paths):
+            return None
+    except (OSError, ValueError, KeyError, TypeError, struct.error):
+        return None
+
+    width, height = header['width'], header['height']
+    view = memoryview(data)
+    offset = PREFIX.size + header_length
+    layer_size = width * height * 2
+    atlas_width, atlas_height = header['atlas_size']
+    if len(data) != offset + layer_size * len(header['tile_layers']) + atlas_width * atlas_height * 4:
+        return None  # 写入时被截断或被其他程序改动过
+
+    # 图集整体转换为显示格式, 每个图块是它的子surface
+    if headless:
+        images = [None] + [SurfaceStub(rect[2:]) for rect in header['images']]
+    else:
+        atlas_size = header['atlas_size']
+        atlas_bytes = view[offset + layer_size * len(header['tile_layers']):]
+        atlas = pygame.image.frombuffer(atlas_bytes, atlas_size, 'RGBA').convert_alpha()
+        images = [None] + [atlas.subsurface(rect) for rect in header['images']]
+
+    layers = []
+    for name in header['tile_layers']:
+        gids = np.frombuffer(data, dtype='<u2', count=width * height, offset=offset).reshape(height, width)
+        layers.append(TileLayer(name, gids, images))
+        offset += layer_size
+    for layer in header['object_layers']:
+        layers.append(ObjectLayer(layer['name'], [MapObject(x, y, name, images[image])
+                                                  for x, y, name, image in layer['objects']]))
+    return LevelData(width, height, layers)
+
+
+def load_level(tmx_path=MAP_PATH, cache_path=LEVEL_CACHE_PATH, headless=False):
+    """优先读取编译缓存, 失效时重新编译(编译需要显示器, 无窗口时要先在有显示的进程中编译)"""
+    level_data = read_level(tmx_path, cache_path, headless)
+    if level_data is None:
+        compile_level(tmx_path, cache_path)
+        level_data = read_level(tmx_path, cache_path, headless)
+    return level_data
@@ -1,30 +1,86 @@
+import argparse
+import random
 import pygame, sys
 from settings import *
 from level import Level
+from debug import profiler
+from replay import Recorder, seed_number
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, seed=None, record_path=None):
+        # 指定seed时所有随机结果(苹果、天气、雨滴)可以复现, 录制时随机生成一个写入记录
+        if record_path and seed is None:
+            seed = random.getrandbits(32)
+        if seed is not None:
+            random.seed(seed)
+        self.recorder = Recorder(record_path, seed) if record_path else None
+
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption('Sprout land')
         self.clock = pygame.time.Clock()
-        self.level = Level()
+        self.accumulator = 0  # 固定步长模式下尚未模拟的时间(秒)
+        self.level = Level(progress=self.draw_loading, seed=seed)
+
+    def draw_loading(self, done, total):
+        # 加载界面: 资源解码期间保持窗口响应并显示进度条
+        pygame.event.pump()
+        self.screen.fill('black')
+        bar_rect = pygame.Rect(0, 0, SCREEN_WIDTH // 2, 20)
+        bar_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        pygame.draw.rect(self.screen, 'white', bar_rect, 2)
+        fill_rect = bar_rect.inflate(-8, -8)
+        fill_rect.width = fill_rect.width * done // total
+        pygame.draw.rect(self.screen, 'white', fill_rect)
+        pygame.display.update()
 
     def run(self):
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    if self.recorder:
+                        self.recorder.close()
                     pygame.quit()
                     sys.exit()
+                if event.type == pygame.KEYDOWN:
+                    profiler.handle_key(event.key)  # F3: 性能HUD, F4: 碰撞箱, F5: sprite跟踪, F8: 记录, F9: 导出
+                    if event.key == RENDER_SCALE_KEY:
+                        self.level.cycle_render_scale()  # F6: 渲染缩放 1 / 0.75 / 0.5
+
+            # 返回自上一次tick()调用以来的毫秒数,转换为秒; FPS_CAP > 0 时用sleep限制帧率
+            dt = self.clock.tick(FPS_CAP) / 1000
+            if self.recorder:
+                # 使用记录中保存的精度, 回放时的模拟与本次完全相同
+                dt = self.recorder.record(pygame.key.get_pressed(), dt)
+            self.step(dt)
 
-            # 返回自上一次tick()调用以来的毫秒数,转换为秒
-            dt = self.clock.tick() / 1000
-            print(f'{"*" * 20} {dt} {"*" * 20}')
-            self.level.run(dt)
+    def step(self, dt):
+        """推进一帧并提交到显示器, 回放时不经过事件循环直接调用"""
+        if FIXED_TIMESTEP:
+            dirty_rects = self.run_fixed(dt)
+        else:
+            dirty_rects = self.level.run(dt)
+
+        # 局部重绘时只提交变化的区域
+        if dirty_rects is None:
             pygame.display.update()
+        else:
+            pygame.display.update(dirty_rects)
+
+    def run_fixed(self, dt):
+        # 固定步长: 累积真实时间, 按FIXED_TIMESTEP推进模拟, 卡顿时最多追赶MAX_CATCHUP_STEPS步
+        self.accumulator += dt
+        steps = min(int(self.accumulator / FIXED_TIMESTEP), MAX_CATCHUP_STEPS)
+        # 超出追赶上限的时间直接丢弃, 避免卡顿后出现一次巨大的时间跳跃
+        self.accumulator = min(self.accumulator - steps * FIXED_TIMESTEP, FIXED_TIMESTEP)
+        return self.level.run(FIXED_TIMESTEP, steps, self.accumulator / FIXED_TIMESTEP)
 
 
 if __name__ == '__main__':
-    game = Game()
+    parser = argparse.ArgumentParser(description='Sprout land')
+    parser.add_argument('--record', metavar='PATH', help='record the input of this session for replay.py')
+    parser.add_argument('--seed', type=seed_number)
+    args = parser.parse_args()
+    game = Game(args.seed, args.record)
     game.run()
@@ -0,0 +1,166 @@
+"""surface内存审计
+
+在SDL dummy显示驱动下建立Level, 统计Level.all_sprites、Overlay和Player.animations引用的所有surface:
+按类别和图层汇总像素内存, 找出像素完全相同却没有共享的surface, 以及没有转换为显示格式的surface.
+在项目根目录运行:
+
+    python src/memaudit.py
+    python src/memaudit.py --scale 16 --top 10
+"""
+import argparse
+import math
+import os
+import sys
+from contextlib import redirect_stdout
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from settings import *
+from resources import fingerprint, registry
+from benchmark import square_number
+
+LAYER_NAMES = {z: name for name, z in LAYERS.items()}
+
+
+def surface_bytes(surf):
+    """surface自身区域的像素字节数, 子surface只计算它覆盖的部分"""
+    return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+
+def root_bytes(surf):
+    """surface实际持有的像素内存, 子surface计入它的根surface"""
+    root = surf.get_abs_parent()
+    return root.get_pitch() * root.get_height()
+
+
+def display_formats():
+    """convert()和convert_alpha()得到的像素格式"""
+    probe = pygame.Surface((1, 1))
+    return {(surf.get_bitsize(), surf.get_masks()) for surf in (probe.convert(), probe.convert_alpha())}
+
+
+def level_surfaces(level):
+    """返回 [(surface, 类别, 图层)], 同一个surface被多处引用时出现多次"""
+    entries = []
+    for sprite in level.all_sprites:
+        category = getattr(sprite, 'sprite_type', None) or type(sprite).__name__.lower()
+        entries.append((sprite.image, category, LAYER_NAMES.get(sprite.z, str(sprite.z))))
+        # 没有画出来的帧也占用内存
+        if hasattr(sprite, 'clock'):
+            entries.extend((frame, category, LAYER_NAMES[sprite.z]) for frame in sprite.clock.frames)
+        if hasattr(sprite, 'stump_surf'):
+            entries.append((sprite.stump_surf, category, LAYER_NAMES[sprite.z]))
+    overlay = level.overlay
+    for surf in chain_values(overlay.tools_surf, overlay.seeds_surf):
+        entries.append((surf, 'overlay', 'hud'))
+    for frames in level.player.animations.values():
+        entries.extend((surf, 'player', LAYER_NAMES[level.player.z]) for surf in frames)
+    return entries
+
+
+def chain_values(*dicts):
+    return [value for values in dicts for value in values.values()]
+
+
+def audit(entries):
+    """按类别和图层汇总, 返回报告字典
+
+    每个surface对象只计算一次(第一次出现的类别和图层); duplicates是像素相同的不同surface,
+    wasted_bytes是共享后可以省下的字节数
+    """
+    formats = display_formats()
+    seen = {}
+    for surf, category, layer in entries:
+        seen.setdefault(id(surf), (surf, category, layer))
+
+    categories = {}
+    layers = {}
+    groups = {}
+    unconverted = []
+    roots = {}
+    for surf, category, layer in seen.values():
+        size = surface_bytes(surf)
+        for table, key in ((categories, category), (layers, layer)):
+            row = table.setdefault(key, {'surfaces': 0, 'bytes': 0})
+            row['surfaces'] += 1
+            row['bytes'] += size
+        groups.setdefault(fingerprint(surf), []).append((surf, category))
+        if (surf.get_bitsize(), surf.get_masks()) not in formats:
+            unconverted.append((category, layer, surf.get_size(), surf.get_bitsize()))
+        root = surf.get_abs_parent()
+        roots[id(root)] = root
+
+    duplicates = []
+    for group in groups.values():
+        if len(group) > 1:
+            surf, category = group[0]
+            duplicates.append({
+                'size': surf.get_size(),
+                'copies': len(group),
+                'categories': sorted({category for _, category in group}),
+                'wasted_bytes': surface_bytes(surf) * (len(group) - 1),
+            })
+    duplicates.sort(key=lambda entry: -entry['wasted_bytes'])
+
+    return {
+        'surfaces': len(seen),
+        'unique_pixels': len(groups),
+        'referenced_bytes': sum(row['bytes'] for row in categories.values()),
+        'allocated_bytes': sum(root_bytes(root) for root in roots.values()),
+        'categories': categories,
+        'layers': layers,
+        'duplicates': duplicates,
+        'wasted_bytes': sum(entry['wasted_bytes'] for entry in duplicates),
+        'unconverted': unconverted,
+    }
+
+
+def kib(size):
+    return f'{size / 1024:9.1f} KiB'
+
+
+def print_report(report, top=5):
+    print(f"{report['surfaces']} surfaces, {report['unique_pixels']} unique, "
+          f"referenced {kib(report['referenced_bytes']).strip()}, allocated {kib(report['allocated_bytes']).strip()}")
+    for title, table in (('category', report['categories']), ('layer', report['layers'])):
+        print(f'by {title}:')
+        for name, row in sorted(table.items(), key=lambda item: -item[1]['bytes']):
+            print(f"  {name:<16} {row['surfaces']:5d} surfaces {kib(row['bytes'])}")
+    print(f"duplicates: {len(report['duplicates'])} groups, {kib(report['wasted_bytes']).strip()} could be shared")
+    for entry in report['duplicates'][:top]:
+        print(f"  {entry['copies']:4d} x {entry['size'][0]}x{entry['size'][1]} "
+              f"({', '.join(entry['categories'])}) {kib(entry['wasted_bytes'])}")
+    print(f"unconverted: {len(report['unconverted'])}")
+    for category, layer, size, bits in report['unconverted'][:top]:
+        print(f'  {category} ({layer}) {size[0]}x{size[1]} {bits} bit')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Surface memory audit')
+    parser.add_argument('--scale', type=square_number, default=1, help='tile the shipped map, must be a square number')
+    parser.add_argument('--top', type=int, default=5, help='how many duplicate groups to list')
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    from level import Level
+    from levelcache import load_level
+
+    side = math.isqrt(args.scale)
+    level_data = load_level(MAP_PATH)
+    if side > 1:
+        level_data = level_data.tiled(side, side)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        level = Level(level_data=level_data)
+        level.update(0)  # 建立待加入的sprite
+
+    print_report(audit(level_surfaces(level)), args.top)
+    stats = registry.stats()
+    print(f"registry: {stats['surfaces']} surfaces ({stats['shared']} shared), {stats['atlases']} atlases, "
+          f"hits {stats['hits']} misses {stats['misses']}, {kib(stats['pixel_bytes']).strip()}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
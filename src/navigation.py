@@ -0,0 +1,239 @@
+import heapq
+from collections import OrderedDict
+import numpy as np
+from settings import *
+
+# 八个方向 (dx, dy, 代价), 斜向移动不能穿过障碍物的角
+NEIGHBOURS = [(dx, dy, 1.4142135 if dx and dy else 1.0)
+              for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+
+class NavGrid:
+    """按瓦片的可通行网格, blocked记录覆盖每个瓦片的障碍物数量, 为0时可以通行
+
+    会变化的障碍物(树)按key登记覆盖的瓦片范围, 变化时只更新这一块
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.blocked = np.zeros((height, width), dtype=np.uint8)
+        self.obstacles = {}  # key -> 覆盖的瓦片范围 (x0, y0, x1, y1)
+
+    def walkable(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height and not self.blocked[y, x]
+
+    def block_tiles(self, tiles):
+        """不会变化的障碍物(碰撞图层、栅栏)"""
+        tiles = list(tiles)
+        if tiles:
+            xs, ys = zip(*tiles)
+            np.add.at(self.blocked, (np.array(ys), np.array(xs)), 1)
+
+    def region(self, rect):
+        """与rect相交的瓦片范围"""
+        return (max(rect.left // TILE_SIZE, 0), max(rect.top // TILE_SIZE, 0),
+                min((rect.right - 1) // TILE_SIZE + 1, self.width), min((rect.bottom - 1) // TILE_SIZE + 1, self.height))
+
+    def set_obstacle(self, key, rect):
+        """添加或修改障碍物, rect为None时移除; 返回 (变为可通行的瓦片, 变为不可通行的瓦片)"""
+        old = self.obstacles.pop(key, None)
+        new = self.region(rect) if rect is not None else None
+        if old is None and new is None:
+            return [], []
+
+        # 只比较新旧范围合起来的这一块
+        regions = [region for region in (old, new) if region]
+        bx0, by0 = min(region[0] for region in regions), min(region[1] for region in regions)
+        bx1, by1 = max(region[2] for region in regions), max(region[3] for region in regions)
+        before = self.blocked[by0:by1, bx0:bx1].copy()
+        if old:
+            x0, y0, x1, y1 = old
+            self.blocked[y0:y1, x0:x1] -= 1
+        if new:
+            x0, y0, x1, y1 = self.obstacles[key] = new
+            self.blocked[y0:y1, x0:x1] += 1
+        after = self.blocked[by0:by1, bx0:bx1]
+        freed_ys, freed_xs = np.nonzero((before > 0) & (after == 0))
+        blocked_ys, blocked_xs = np.nonzero((before == 0) & (after > 0))
+        return (list(zip((freed_xs + bx0).tolist(), (freed_ys + by0).tolist())),
+                list(zip((blocked_xs + bx0).tolist(), (blocked_ys + by0).tolist())))
+
+    def around(self, regions):
+        """紧贴这些瓦片范围外侧且可以通行的瓦片, 用作走到某物旁边的目标"""
+        tiles = set()
+        for x0, y0, x1, y1 in regions:
+            for y in range(y0 - 1, y1 + 1):
+                for x in range(x0 - 1, x1 + 1):
+                    if not (x0 <= x < x1 and y0 <= y < y1) and self.walkable(x, y):
+                        tiles.add((x, y))
+        return tiles
+
+
+class FlowField:
+    """从所有瓦片走向goals的最短路径方向, 用Dijkstra一次算出
+
+    directions[y, x] 是下一步要走向的相邻瓦片 (dx, dy), 在目标上或不可达时为 (0, 0);
+    任意多个agent共用一个flow field, 每一步只需要一次数组查找
+    """
+
+    def __init__(self, grid, goals):
+        self.grid = grid
+        self.goals = frozenset(goals)
+        self.distance = np.full((grid.height, grid.width), np.inf, dtype=np.float32)
+        self.directions = np.zeros((grid.height, grid.width, 2), dtype=np.int8)
+
+        # 整张地图一次算出时转换为list, 逐元素访问比numpy快得多
+        distance = self.distance.tolist()
+        for x, y in self.goals:
+            if grid.walkable(x, y):
+                distance[y][x] = 0.0
+        self.relax([(x, y) for x, y in self.goals if grid.walkable(x, y)], distance, grid.blocked.tolist())
+        self.distance[:] = distance
+
+    def relax(self, seeds, distance=None, blocked=None):
+        """从seeds开始向外更新更短的距离, 只访问距离变小的瓦片
+
+        distance和blocked默认直接使用numpy数组, 增量更新时访问的瓦片很少, 不需要复制整张地图
+        """
+        grid = self.grid
+        width, height = grid.width, grid.height
+        distance = self.distance if distance is None else distance
+        blocked = grid.blocked if blocked is None else blocked
+        directions = {}
+        heap = [(float(distance[y][x]), x, y) for x, y in seeds if distance[y][x] != np.inf]
+        heapq.heapify(heap)
+
+        while heap:
+            d, x, y = heapq.heappop(heap)
+            if d > distance[y][x]:
+                continue
+            for dx, dy, cost in NEIGHBOURS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height) or blocked[ny][nx]:
+                    continue
+                if dx and dy and (blocked[y][nx] or blocked[ny][x]):
+                    continue
+                nd = d + cost
+                if nd < distance[ny][nx]:
+                    distance[ny][nx] = nd
+                    directions[nx, ny] = (-dx, -dy)
+                    heapq.heappush(heap, (nd, nx, ny))
+
+        if directions:
+            xs, ys = zip(*directions)
+            self.directions[ys, xs] = list(directions.values())
+
+    def neighbours(self, x, y):
+        for dx, dy, _ in NEIGHBOURS:
+            if 0 <= x + dx < self.grid.width and 0 <= y + dy < self.grid.height:
+                yield x + dx, y + dy
+
+    def invalidate(self, blocked):
+        """清除路径经过blocked中瓦片的所有瓦片, 返回被清除的瓦片
+
+        包括blocked本身、斜向穿过它们的角的瓦片, 以及方向链指向这些瓦片的所有瓦片
+        """
+        distance, directions = self.distance, self.directions
+        stack = list(blocked)
+        for x, y in blocked:
+            for nx, ny in self.neighbours(x, y):
+                sx, sy = directions[ny, nx].tolist()
+                if sx and sy and (x, y) in ((nx + sx, ny), (nx, ny + sy)):
+                    stack.append((nx, ny))
+
+        cleared = set()
+        while stack:
+            x, y = stack.pop()
+            if (x, y) in cleared or distance[y, x] == np.inf:
+                continue
+            cleared.add((x, y))
+            distance[y, x] = np.inf
+            directions[y, x] = 0
+            for nx, ny in self.neighbours(x, y):
+                sx, sy = directions[ny, nx].tolist()
+                if (sx or sy) and (nx + sx, ny + sy) == (x, y):
+                    stack.append((nx, ny))
+        return cleared
+
+    def update(self, freed, blocked):
+        """网格变化后增量更新, 只访问受影响的瓦片
+
+        被挡住的路径先清除, 再从清除范围和新空出的瓦片周围仍然可达的瓦片重新扩展
+        """
+        grid = self.grid
+        changed = set(freed) | self.invalidate(blocked)
+        seeds = set()
+        for x, y in changed:
+            if (x, y) in self.goals and grid.walkable(x, y):
+                self.distance[y, x] = 0
+                self.directions[y, x] = 0
+                seeds.add((x, y))
+            for nx, ny in self.neighbours(x, y):
+                if grid.walkable(nx, ny):
+                    seeds.add((nx, ny))
+        self.relax(seeds)
+
+
+class FlowFieldCache:
+    """按目标缓存flow field, 超出capacity时淘汰最久没用过的"""
+
+    def __init__(self, grid, capacity=NAV_CACHE_SIZE):
+        self.grid = grid
+        self.capacity = capacity
+        self.fields = OrderedDict()  # frozenset(目标瓦片) -> FlowField
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, goals):
+        key = frozenset(goals)
+        field = self.fields.get(key)
+        if field is None:
+            self.misses += 1
+            field = self.fields[key] = FlowField(self.grid, key)
+            if len(self.fields) > self.capacity:
+                self.fields.popitem(last=False)
+        else:
+            self.hits += 1
+            self.fields.move_to_end(key)
+        return field
+
+    def update(self, freed, blocked):
+        """网格变化后增量更新所有缓存的flow field"""
+        if freed or blocked:
+            for field in self.fields.values():
+                field.update(freed, blocked)
+
+
+class AgentGroup:
+    """走向同一组目标的agent, 位置按struct of arrays存放, 每帧对所有agent一次向量化移动"""
+
+    def __init__(self, goals, positions, speed=AGENT_SPEED):
+        self.goals = frozenset(goals)
+        positions = np.array(positions, dtype=np.float32).reshape(-1, 2)
+        self.x = positions[:, 0].copy()
+        self.y = positions[:, 1].copy()
+        self.speed = speed
+        self.arrived = np.zeros(len(positions), dtype=bool)  # 已在目标上或无法到达
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def finished(self):
+        return bool(self.arrived.all())
+
+    def update(self, field, dt):
+        height, width = field.distance.shape
+        tx = np.clip(self.x // TILE_SIZE, 0, width - 1).astype(np.intp)
+        ty = np.clip(self.y // TILE_SIZE, 0, height - 1).astype(np.intp)
+        step = field.directions[ty, tx]
+        self.arrived = ~step.any(axis=1)
+
+        # 走向下一个瓦片的中心, 贴着瓦片中心走不会擦过障碍物的角
+        dx = (tx + step[:, 0]) * TILE_SIZE + TILE_SIZE / 2 - self.x
+        dy = (ty + step[:, 1]) * TILE_SIZE + TILE_SIZE / 2 - self.y
+        length = np.hypot(dx, dy)
+        scale = np.minimum(self.speed * dt, length) / np.maximum(length, 1e-6)
+        self.x += dx * scale
+        self.y += dy * scale
@@ -1,5 +1,6 @@
 import pygame
 from settings import *
+from resources import registry
 
 
 class Overlay:
@@ -8,11 +9,18 @@ class Overlay:
         self.player = player
 
         overlay_path = 'assets/graphics/overlay/'
-        self.tools_surf = {tool: pygame.image.load(overlay_path + tool + '.png').convert_alpha()
+        self.tools_surf = {tool: registry.load(overlay_path + tool + '.png')
                            for tool in player.tools}
-        self.seeds_surf = {seed: pygame.image.load(overlay_path + seed + '.png').convert_alpha()
+        self.seeds_surf = {seed: registry.load(overlay_path + seed + '.png')
                            for seed in player.seeds}
 
+    def rects(self):
+        """界面占用的屏幕区域, 局部重绘时每帧都要恢复并重画"""
+        tool_surf = self.tools_surf[self.player.selected_tool]
+        seed_surf = self.seeds_surf[self.player.selected_seed]
+        return [tool_surf.get_rect(midbottom=OVERLAY_POSITIONS['tool']),
+                seed_surf.get_rect(midbottom=OVERLAY_POSITIONS['seed'])]
+
     def display(self):
         # tool
         tool_surf = self.tools_surf[self.player.selected_tool]
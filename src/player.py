@@ -2,10 +2,11 @@ import pygame
 from settings import *
 from timer import Timer
 from support import import_folder
+from debug import profiler
 
 
 class Player(pygame.sprite.Sprite):
-    def __init__(self, pos, groups, collision_sprites, tree_sprites):
+    def __init__(self, pos, groups, collision_sprites, interactions, soil_layer, crop_layer, scheduler):
         super().__init__(groups)
 
         self.import_assets()
@@ -16,6 +17,7 @@ class Player(pygame.sprite.Sprite):
         self.image = self.animations[self.status][self.frame_index]
         self.rect = self.image.get_rect(center=pos)
         self.z = LAYERS['main']
+        self.movable = True  # 位置每帧变化, 需要同步空间索引
 
         # 移动属性
         self.direction = pygame.math.Vector2()
@@ -26,12 +28,12 @@ class Player(pygame.sprite.Sprite):
         self.collision_sprites = collision_sprites
         self.hitbox = self.rect.copy().inflate((-126, -70))
 
-        # 定时器
+        # 定时器, 由Level的scheduler在到期时触发
         self.timers = {
-            'tool_use': Timer(duration=350, func=self.use_tool),
-            'tool_switch': Timer(duration=200),
-            'seed_use': Timer(duration=350, func=self.use_seed),
-            'seed_switch': Timer(duration=200),
+            'tool_use': Timer(duration=350, func=self.use_tool, scheduler=scheduler),
+            'tool_switch': Timer(duration=200, scheduler=scheduler),
+            'seed_use': Timer(duration=350, func=self.use_seed, scheduler=scheduler),
+            'seed_switch': Timer(duration=200, scheduler=scheduler),
         }
 
         # 工具
@@ -44,8 +46,18 @@ class Player(pygame.sprite.Sprite):
         self.seed_index = 0
         self.selected_seed = self.seeds[self.seed_index]
 
-        # 交互
-        self.tree_sprites = tree_sprites
+        # 物品
+        self.item_inventory = {'wood': 0, 'apple': 0, 'corn': 0, 'tomato': 0}
+        self.seed_inventory = {'corn': 5, 'tomato': 5}
+        self.money = 200
+
+        # 交互, 工具目标都按瓦片查询
+        self.interactions = interactions
+        self.soil_layer = soil_layer
+        self.crop_layer = crop_layer
+
+        # 输入来源, 基准测试等场景可替换为脚本输入
+        self.key_source = pygame.key.get_pressed
 
     def import_assets(self):
         self.animations = {'up': [], 'down': [], 'left': [], 'right': [],
@@ -66,7 +78,7 @@ class Player(pygame.sprite.Sprite):
         self.image = self.animations[self.status][int(self.frame_index)]
 
     def input(self):
-        keys = pygame.key.get_pressed()
+        keys = self.key_source()
 
         if not self.timers['tool_use'].active:
             # 方向
@@ -116,21 +128,24 @@ class Player(pygame.sprite.Sprite):
 
     def use_tool(self):
         if self.selected_tool == 'axe':
-            print('axe use')
-            for tree in self.tree_sprites.sprites():
-                if tree.rect.collidepoint(self.target_pos):
-                    tree.damage()
+            for tree in self.interactions.at(self.target_pos, 'tree'):
+                tree.damage()
+                if not tree.alive:
+                    self.interactions.remove(tree)  # 树桩不再是斧头的目标
         elif self.selected_tool == 'hoe':
-            pass
+            self.soil_layer.till(self.target_pos)
         elif self.selected_tool == 'water':
-            pass
+            self.soil_layer.water(self.target_pos)
+            self.crop_layer.water(self.target_pos)
 
     def get_tool_target_pos(self):
         self.target_pos = self.rect.center + PLAYER_TOOL_OFFSET[self.status.split('_')[0]]
 
     def use_seed(self):
-        # print(self.selected_seed)
-        pass
+        self.get_tool_target_pos()
+        if self.seed_inventory[self.selected_seed] > 0:
+            if self.crop_layer.plant(self.target_pos, self.selected_seed):
+                self.seed_inventory[self.selected_seed] -= 1
 
     def get_status(self):
         # 检测是否为空闲状态
@@ -143,30 +158,29 @@ class Player(pygame.sprite.Sprite):
             self.status = self.status.split('_')[0] + '_' + self.selected_tool
             self.get_tool_target_pos()
 
-    def update_timers(self):
-        for name, timer in self.timers.items():
-            timer.update()
-
-    def collision(self, direction):
-        for sprite in self.collision_sprites.sprites():  # 遍历所有碰撞对象
-            if hasattr(sprite, 'hitbox'):  # 确保对方有碰撞箱
-                if sprite.hitbox.colliderect(self.hitbox):  # 碰撞箱重叠检测
-                    if direction == 'horizontal':
-                        if self.direction.x > 0:  # 向右移动时碰撞
-                            self.hitbox.right = sprite.hitbox.left  # 玩家右边界 = 障碍物左边界（阻止穿透）
-                        if self.direction.x < 0:  # 向左移动时碰撞
-                            self.hitbox.left = sprite.hitbox.right  # 玩家左边界 = 障碍物右边界
-                        # 同步实际位置（修正后）
-                        self.rect.centerx = self.hitbox.centerx
-                        self.pos.x = self.hitbox.centerx
-
-                    if direction == 'vertical':
-                        if self.direction.y > 0:  # moving down
-                            self.hitbox.bottom = sprite.hitbox.top
-                        if self.direction.y < 0:  # moving up
-                            self.hitbox.top = sprite.hitbox.bottom
-                        self.rect.centery = self.hitbox.centery
-                        self.pos.y = self.hitbox.centery
+    def collision(self, direction, swept_rect):
+        # 只检查移动扫过区域附近的碰撞对象
+        candidates = self.collision_sprites.query(swept_rect)
+        if profiler.enabled:
+            profiler.count('collision checks', len(candidates))
+        for sprite in candidates:
+            if sprite.hitbox.colliderect(self.hitbox):  # 碰撞箱重叠检测
+                if direction == 'horizontal':
+                    if self.direction.x > 0:  # 向右移动时碰撞
+                        self.hitbox.right = sprite.hitbox.left  # 玩家右边界 = 障碍物左边界（阻止穿透）
+                    if self.direction.x < 0:  # 向左移动时碰撞
+                        self.hitbox.left = sprite.hitbox.right  # 玩家左边界 = 障碍物右边界
+                    # 同步实际位置（修正后）
+                    self.rect.centerx = self.hitbox.centerx
+                    self.pos.x = self.hitbox.centerx
+
+                if direction == 'vertical':
+                    if self.direction.y > 0:  # moving down
+                        self.hitbox.bottom = sprite.hitbox.top
+                    if self.direction.y < 0:  # moving up
+                        self.hitbox.top = sprite.hitbox.bottom
+                    self.rect.centery = self.hitbox.centery
+                    self.pos.y = self.hitbox.centery
 
     def move(self, dt):
         # 向量归一化
@@ -174,21 +188,22 @@ class Player(pygame.sprite.Sprite):
             self.direction = self.direction.normalize()
 
         # 水平移动更新
+        swept_rect = self.hitbox.copy()
         self.pos.x += self.direction.x * self.speed * dt
         self.hitbox.centerx = round(self.pos.x)
         self.rect.centerx = self.hitbox.centerx
-        self.collision('horizontal')
+        self.collision('horizontal', swept_rect.union(self.hitbox))
 
         # 垂直移动更新
+        swept_rect = self.hitbox.copy()
         self.pos.y += self.direction.y * self.speed * dt
         self.hitbox.centery = round(self.pos.y)
         self.rect.centery = self.hitbox.centery
-        self.collision('vertical')
+        self.collision('vertical', swept_rect.union(self.hitbox))
 
     def update(self, dt):
         self.input()
         self.get_status()
-        self.update_timers()
 
         self.move(dt)
         self.animate(dt)
@@ -0,0 +1,95 @@
+import numpy as np
+from settings import *
+from support import import_folder
+
+
+class ParticlePool:
+    """预分配数组中的粒子, 生成和回收只改标记, 不为单个粒子分配对象"""
+
+    def __init__(self, capacity, frames):
+        self.frames = frames
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)  # 剩余寿命(秒)
+        self.frame = np.zeros(capacity, dtype=np.uint8)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.pending = 0.0  # 按速率生成时不足一个的部分留到下一帧
+
+    def __len__(self):
+        return int(np.count_nonzero(self.active))
+
+    def spawn(self, count, rng, view_rect, lifetime, direction=(0, 0), speed=(0, 0)):
+        """在view_rect内生成最多count个粒子, 池满时多出的直接丢弃"""
+        slots = np.flatnonzero(~self.active)[:count]
+        n = len(slots)
+        if not n:
+            return
+        self.x[slots] = rng.uniform(view_rect.left, view_rect.right, n)
+        self.y[slots] = rng.uniform(view_rect.top, view_rect.bottom, n)
+        speeds = rng.uniform(*speed, n)
+        self.vx[slots] = direction[0] * speeds
+        self.vy[slots] = direction[1] * speeds
+        self.life[slots] = rng.uniform(*lifetime, n)
+        self.frame[slots] = rng.integers(0, len(self.frames), n)
+        self.active[slots] = True
+
+    def update(self, dt):
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+        self.life -= dt
+        self.active &= self.life > 0
+
+    def draw(self, surface, offset, scaler=None):
+        """所有存活的粒子用一次 Surface.blits 绘制"""
+        slots = np.flatnonzero(self.active)
+        frames = self.frames
+        scale = 1
+        if scaler:
+            frames = [scaler.image(frame) for frame in frames]
+            scale = scaler.scale
+        xs = ((self.x[slots] - int(offset.x)) * scale).astype(np.int32).tolist()
+        ys = ((self.y[slots] - int(offset.y)) * scale).astype(np.int32).tolist()
+        surface.blits(zip([frames[i] for i in self.frame[slots].tolist()], zip(xs, ys)), False)
+        return len(slots)
+
+
+class Rain:
+    """雨滴和地面水花两个粒子池, 只在摄像机范围内生成
+
+    绘制通过CameraGroup的图层回调, 分别画在rain floor和rain drops图层
+    """
+
+    def __init__(self, seed=None):
+        self.raining = False
+        self.rng = np.random.default_rng(seed)
+        self.drops = ParticlePool(RAIN_CAPACITY, import_folder('assets/graphics/rain/drops'))
+        self.floor = ParticlePool(RAIN_CAPACITY, import_folder('assets/graphics/rain/floor'))
+
+    @property
+    def active(self):
+        # 停雨后已有的粒子继续走完寿命
+        return self.raining or self.drops.active.any() or self.floor.active.any()
+
+    def update(self, dt, view_rect):
+        self.drops.update(dt)
+        self.floor.update(dt)
+        if self.raining:
+            self.drops.spawn(self.spawn_count(self.drops, RAIN_DROP_RATE, dt), self.rng, view_rect,
+                             RAIN_LIFETIME, RAIN_DIRECTION, RAIN_SPEED)
+            self.floor.spawn(self.spawn_count(self.floor, RAIN_FLOOR_RATE, dt), self.rng, view_rect,
+                             RAIN_LIFETIME)
+
+    @staticmethod
+    def spawn_count(pool, rate, dt):
+        pool.pending += rate * dt
+        count = int(pool.pending)
+        pool.pending -= count
+        return count
+
+    def draw_floor(self, surface, offset, scaler=None):
+        return self.floor.draw(surface, offset, scaler)
+
+    def draw_drops(self, surface, offset, scaler=None):
+        return self.drops.draw(surface, offset, scaler)
@@ -0,0 +1,219 @@
+import weakref
+import pygame
+from bisect import bisect_left
+from itertools import count
+from settings import *
+
+
+class LayerBucket:
+    """同一图层的sprite, 按 (centery, 绘制类别, 加入顺序) 保持有序"""
+
+    def __init__(self):
+        self.keys = []
+        self.sprites = []
+        self.sprite_keys = {}
+        self.max_half_height = 0  # 用于根据摄像机范围二分查找
+
+    def insert(self, sprite, key):
+        index = bisect_left(self.keys, key)
+        self.keys.insert(index, key)
+        self.sprites.insert(index, sprite)
+        self.sprite_keys[sprite] = key
+        self.max_half_height = max(self.max_half_height, sprite.rect.height // 2 + 1)
+
+    def remove(self, sprite):
+        key = self.sprite_keys.pop(sprite)
+        index = bisect_left(self.keys, key)
+        del self.keys[index]
+        del self.sprites[index]
+        return key
+
+    def reorder(self, sprite):
+        """只有centery变化时才重新排序该sprite"""
+        key = self.sprite_keys[sprite]
+        if key[0] != sprite.rect.centery:
+            self.remove(sprite)
+            self.insert(sprite, (sprite.rect.centery,) + key[1:])
+
+    def in_range(self, top, bottom):
+        """返回centery可能让sprite与 [top, bottom) 相交的一段有序sprite"""
+        start = bisect_left(self.keys, (top - self.max_half_height,))
+        end = bisect_left(self.keys, (bottom + self.max_half_height,))
+        return self.sprites[start:end]
+
+
+class RenderQueue:
+    """按图层分桶的渲染队列, 每层用一次 Surface.blits 提交"""
+
+    def __init__(self):
+        self.buckets = {layer: LayerBucket() for layer in LAYERS.values()}
+        self.sprite_layers = {}
+        self.counter = count()  # 加入顺序, 保证相同centery时的绘制顺序稳定
+
+    def add(self, sprite):
+        bucket = self.buckets.setdefault(sprite.z, LayerBucket())
+        order = getattr(sprite, 'draw_order', len(MAP_DRAW_ORDER))
+        bucket.insert(sprite, (sprite.rect.centery, order, next(self.counter)))
+        self.sprite_layers[sprite] = sprite.z
+
+    def remove(self, sprite):
+        layer = self.sprite_layers.pop(sprite, None)
+        if layer is not None:
+            self.buckets[layer].remove(sprite)
+
+    def reorder(self, sprite):
+        layer = self.sprite_layers.get(sprite)
+        if layer is not None:
+            self.buckets[layer].reorder(sprite)
+
+    def draw(self, surface, offset, view_rect, visible, rects=None, min_layer=None, renderers=None, scaler=None):
+        """rects中的sprite使用给定的rect(插值位置)绘制, 返回实际绘制的sprite数量
+
+        min_layer不为None时跳过更低的图层; renderers是 {图层: draw(surface, offset, scaler)},
+        在该图层的sprite之后调用, 用于粒子等不是sprite的内容.
+        scaler不为None时画在缩小的surface上, 使用它缓存的缩放后图像
+        """
+        ox, oy = int(offset.x), int(offset.y)
+        drawn = 0
+        for layer in LAYERS.values():
+            if min_layer is not None and layer < min_layer:
+                continue
+            sprites = self.buckets[layer].in_range(view_rect.top, view_rect.bottom)
+            if scaler:
+                image, position = scaler.image, scaler.position
+                blits = [(image(sprite.image), position(rects.get(sprite, sprite.rect) if rects else sprite.rect, ox, oy))
+                         for sprite in sprites if sprite in visible]
+            elif rects:
+                blits = [(sprite.image, rects.get(sprite, sprite.rect).move(-ox, -oy))
+                         for sprite in sprites if sprite in visible]
+            else:
+                blits = [(sprite.image, sprite.rect.move(-ox, -oy))
+                         for sprite in sprites if sprite in visible]
+            surface.blits(blits, False)
+            drawn += len(blits)
+            if renderers and layer in renderers:
+                renderers[layer](surface, offset, scaler)
+        return drawn
+
+
+class ScaledTarget:
+    """按比例缩小的离屏渲染目标
+
+    每张sprite图像第一次绘制时缩放一次并缓存, 图像被回收后缓存自动释放;
+    原地修改过的图像需要调用discard
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.surface = pygame.Surface((round(SCREEN_WIDTH * scale), round(SCREEN_HEIGHT * scale))).convert()
+        self.images = weakref.WeakKeyDictionary()
+
+    def image(self, surf):
+        scaled = self.images.get(surf)
+        if scaled is None:
+            width, height = surf.get_size()
+            size = (max(round(width * self.scale), 1), max(round(height * self.scale), 1))
+            scaled = self.images[surf] = pygame.transform.smoothscale(surf, size)
+        return scaled
+
+    def position(self, rect, ox, oy):
+        return round((rect.x - ox) * self.scale), round((rect.y - oy) * self.scale)
+
+    def discard(self, surf):
+        self.images.pop(surf, None)
+
+    def present(self, display_surface):
+        """一次放大到整个窗口"""
+        pygame.transform.scale(self.surface, display_surface.get_size(), display_surface)
+
+
+def is_dynamic(sprite):
+    """位置或图像会在不改变组成员的情况下变化的sprite"""
+    return getattr(sprite, 'movable', False) or getattr(sprite, 'animated', False)
+
+
+class DirtyRenderer:
+    """局部重绘模式
+
+    摄像机静止时缓存当前位置下所有静态sprite的合成图, 之后每帧只在变化的区域
+    (移动的sprite、切换了帧的动画、界面)用缓存恢复背景再重绘, 并只提交这些区域.
+    摄像机移动或静态内容变化时退回整屏重绘
+    """
+
+    def __init__(self, render_queue, spatial_index):
+        self.render_queue = render_queue
+        self.spatial_index = spatial_index
+        self.background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.background_offset = None  # 缓存对应的摄像机偏移, None表示缓存无效
+        self.last_offset = None
+        self.drawn = {}  # 上一帧画在屏幕上的动态sprite -> (屏幕rect, image)
+        self.pending = []  # 已移除的动态sprite留下的屏幕区域
+        self.extra_rects = []  # 上一帧的额外区域(界面), 界面切换图标后旧区域也要恢复
+        self.sprites_drawn = 0  # 上一帧实际绘制的sprite数量, 一个sprite在几个区域中重绘时计算几次
+
+    def invalidate(self):
+        self.background_offset = None
+
+    def forget(self, sprite):
+        entry = self.drawn.pop(sprite, None)
+        if entry:
+            self.pending.append(entry[0])
+
+    def current_state(self, dynamic_sprites, visible, offset, rects):
+        ox, oy = int(offset.x), int(offset.y)
+        return {sprite: (rects.get(sprite, sprite.rect).move(-ox, -oy), sprite.image)
+                for sprite in dynamic_sprites if sprite in visible}
+
+    def draw(self, surface, offset, view_rect, visible, dynamic_sprites, rects, extra_rects):
+        """返回需要提交的屏幕区域, 返回None表示整屏"""
+        current = self.current_state(dynamic_sprites, visible, offset, rects)
+        position = (int(offset.x), int(offset.y))
+        if position != self.background_offset:
+            # 摄像机连续两帧不动时才建立缓存, 移动过程中不做额外的绘制
+            if position == self.last_offset:
+                self.background.fill('black')
+                static = {sprite for sprite in visible if not is_dynamic(sprite)}
+                self.render_queue.draw(self.background, offset, view_rect, static)
+                self.background_offset = position
+            self.last_offset = position
+            surface.fill('black')
+            self.sprites_drawn = self.render_queue.draw(surface, offset, view_rect, visible, rects)
+            self.drawn = current
+            self.pending.clear()
+            self.extra_rects = list(extra_rects)
+            return None
+
+        # 图像或位置变化的动态sprite, 新旧两个位置都需要重绘
+        dirty = self.pending + self.extra_rects + list(extra_rects)
+        self.pending = []
+        self.extra_rects = list(extra_rects)
+        for sprite, state in current.items():
+            previous = self.drawn.get(sprite)
+            if previous != state:
+                dirty.append(state[0])
+                if previous:
+                    dirty.append(previous[0])
+        for sprite, (rect, _) in self.drawn.items():
+            if sprite not in current:
+                dirty.append(rect)
+        self.drawn = current
+
+        screen_rect = surface.get_rect()
+        dirty = [rect.clip(screen_rect) for rect in dirty]
+        dirty = [rect for rect in dirty if rect.width and rect.height]
+        self.sprites_drawn = 0
+        for rect in dirty:
+            surface.set_clip(rect)
+            world_rect = rect.move(position)
+            nearby = self.spatial_index.query(world_rect)
+            min_layer = min((sprite.z for sprite in nearby if is_dynamic(sprite)), default=len(LAYERS))
+            if any(sprite.z >= min_layer for sprite in nearby if not is_dynamic(sprite)):
+                # 动态sprite上方有静态sprite, 缓存中已经画过它, 半透明像素不能再叠一次, 整块重画
+                surface.fill('black', rect)
+                self.sprites_drawn += self.render_queue.draw(surface, offset, world_rect, nearby, rects)
+            else:
+                # 最低动态图层以下的内容都在缓存里
+                surface.blit(self.background, rect, rect)
+                self.sprites_drawn += self.render_queue.draw(surface, offset, world_rect, nearby, rects, min_layer)
+        surface.set_clip(None)
+        return dirty
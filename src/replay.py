@@ -0,0 +1,122 @@
+"""输入录制与回放
+
+录制: 每帧保存按键位掩码和dt, 文件头中保存随机种子
+    python src/main.py --record session.rpl
+
+回放: 无窗口地以最快速度重放, 输出帧耗时统计, 每次回放的结果完全相同
+    python src/replay.py session.rpl --repeat 3
+"""
+import argparse
+import os
+import struct
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+
+import pygame
+
+# 文件格式: MAGIC | 版本(u32) | 随机种子(u64) | 每帧 (按键位掩码 u16, dt f32)
+MAGIC = b'SRPL'
+VERSION = 1
+HEADER = struct.Struct('<4sIQ')
+FRAME = struct.Struct('<Hf')
+
+# Player.input用到的按键, 按顺序对应位掩码的各位
+REPLAY_KEYS = (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT,
+               pygame.K_SPACE, pygame.K_q, pygame.K_LCTRL, pygame.K_e)
+
+
+def seed_number(text):
+    """argparse的type: 种子以u64写入文件头"""
+    value = int(text)
+    if not 0 <= value < 2 ** 64:
+        raise argparse.ArgumentTypeError(f'must be between 0 and 2**64 - 1, got {text}')
+    return value
+
+
+class Recorder:
+    def __init__(self, path, seed):
+        header = HEADER.pack(MAGIC, VERSION, seed)  # 种子超出范围时在创建文件之前报错
+        self.file = open(path, 'wb')
+        self.file.write(header)
+
+    def record(self, keys, dt):
+        """写入一帧, 返回按文件精度取整后的dt"""
+        mask = 0
+        for bit, key in enumerate(REPLAY_KEYS):
+            if keys[key]:
+                mask |= 1 << bit
+        data = FRAME.pack(mask, dt)
+        self.file.write(data)
+        return FRAME.unpack(data)[1]
+
+    def close(self):
+        self.file.close()
+
+
+class ReplayKeys:
+    """代替 pygame.key.get_pressed(), 返回记录中当前帧的按键"""
+
+    def __init__(self):
+        self.mask = 0
+
+    def __call__(self):
+        return self
+
+    def __getitem__(self, key):
+        return key in REPLAY_KEYS and bool(self.mask >> REPLAY_KEYS.index(key) & 1)
+
+
+def read_log(path):
+    """返回 (seed, [(mask, dt), ...])"""
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, version, seed = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{path} is not a version {VERSION} replay file')
+    body = memoryview(data)[HEADER.size:]
+    body = body[:len(body) - len(body) % FRAME.size]  # 录制中断时最后一帧可能不完整
+    return seed, list(FRAME.iter_unpack(body))
+
+
+def replay(path):
+    """回放一次, 返回每帧耗时(毫秒)和结束时玩家的位置"""
+    from main import Game
+
+    seed, frames = read_log(path)
+    game = Game(seed)
+    keys = ReplayKeys()
+    game.level.player.key_source = keys
+    samples = []
+    for mask, dt in frames:
+        keys.mask = mask
+        start = perf_counter()
+        game.step(dt)
+        samples.append((perf_counter() - start) * 1000)
+    return samples, sum(dt for _, dt in frames), tuple(game.level.player.rect.center)
+
+
+def main():
+    from benchmark import summarize
+
+    parser = argparse.ArgumentParser(description='Replay a recorded session headlessly')
+    parser.add_argument('path')
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    for run in range(args.repeat):
+        start = perf_counter()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            samples, recorded, end = replay(args.path)
+        elapsed = perf_counter() - start
+        stats = summarize(samples)
+        print(f'run {run + 1}: {len(samples)} frames, recorded {recorded:.1f} s, replayed in {elapsed:.1f} s '
+              f'({recorded / elapsed:.1f}x), player ends at {end}')
+        print(f"  frame    mean {stats['mean']:7.3f}  p50 {stats['p50']:7.3f}  p90 {stats['p90']:7.3f}  "
+              f"p99 {stats['p99']:7.3f}  max {stats['max']:7.3f} ms")
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    sys.exit(main())
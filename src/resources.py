@@ -0,0 +1,184 @@
+import os
+import re
+import struct
+import zlib
+import pygame
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from settings import *
+
+
+class SurfaceStub:
+    """无窗口模拟时代替surface, 只有尺寸, 足够计算rect和碰撞箱"""
+    __slots__ = ('size',)
+
+    def __init__(self, size):
+        self.size = tuple(size)
+
+    def get_size(self):
+        return self.size
+
+    def get_width(self):
+        return self.size[0]
+
+    def get_height(self):
+        return self.size[1]
+
+    def get_rect(self, **kwargs):
+        rect = pygame.Rect((0, 0), self.size)
+        for name, value in kwargs.items():
+            setattr(rect, name, value)
+        return rect
+
+
+def fingerprint(surf):
+    """像素内容的指纹 (尺寸, crc32), 像素相同的surface指纹一定相同, 反之需要再比较像素"""
+    return surf.get_size(), zlib.crc32(pygame.image.tobytes(surf, 'RGBA'))
+
+
+def same_pixels(a, b):
+    return a.get_size() == b.get_size() and pygame.image.tobytes(a, 'RGBA') == pygame.image.tobytes(b, 'RGBA')
+
+
+def png_size(path):
+    """只读PNG文件头中的宽高, 不解码图片"""
+    with open(path, 'rb') as file:
+        header = file.read(24)
+    return struct.unpack('>II', header[16:24])
+
+
+class AssetRegistry:
+    """按路径缓存已转换的surface, 同一张图片只解码一次; 不同路径下像素相同的图片共享同一个surface"""
+
+    def __init__(self):
+        self.surfaces = {}  # path -> surface (可能是图集的子surface)
+        self.atlases = {}  # name -> 图集surface
+        self.fingerprints = {}  # fingerprint -> surface
+        self.shared = 0  # 因像素相同而共享的图片数
+        self.hits = 0
+        self.misses = 0
+        self.headless = False  # 为True时不解码图片, 只返回SurfaceStub, 不需要显示器, 由stubbed()设置
+        self.stubs = {}  # path -> SurfaceStub, 与surfaces分开, 不会混入图集和正常加载的surface
+
+    @contextmanager
+    def stubbed(self):
+        """with块内load只返回SurfaceStub, 退出后恢复, 同一进程中的其他Level仍然加载真正的图片"""
+        previous, self.headless = self.headless, True
+        try:
+            yield self
+        finally:
+            self.headless = previous
+
+    def load(self, path):
+        cache = self.stubs if self.headless else self.surfaces
+        surf = cache.get(path)
+        if surf is None:
+            self.misses += 1
+            if self.headless:
+                surf = SurfaceStub(png_size(path))
+            else:
+                surf = self.share(pygame.image.load(path).convert_alpha())
+            cache[path] = surf
+        else:
+            self.hits += 1
+        return surf
+
+    def preload(self, paths, progress=None, workers=LOAD_WORKERS):
+        """在线程池中解码图片, 再按原顺序在主线程转换为显示格式
+
+        pygame只允许在主线程调用convert_alpha, 解码(读文件+PNG解压)可以并行.
+        progress(done, total)在每张图片转换完成后调用, 可用于绘制加载界面
+        """
+        paths = [path for path in dict.fromkeys(paths) if path not in self.surfaces]
+        total = len(paths)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for done, (path, surf) in enumerate(zip(paths, pool.map(pygame.image.load, paths)), 1):
+                self.misses += 1
+                self.surfaces[path] = self.share(surf.convert_alpha())
+                if progress:
+                    progress(done, total)
+
+    def share(self, surf):
+        """已有像素相同的surface时返回它"""
+        shared = self.fingerprints.setdefault(fingerprint(surf), surf)
+        if shared is surf or not same_pixels(shared, surf):
+            return surf
+        self.shared += 1
+        return shared
+
+    def build_atlas(self, name, paths, width=ATLAS_WIDTH):
+        """把小图按行(shelf)打包进一张图集, 之后load这些路径时返回图集的子surface
+
+        需要在创建使用这些图片的sprite之前调用, 否则已有的引用仍指向原surface.
+        这些路径已经全部在同名图集中时直接返回它, 每次新建Level不会重复打包
+        """
+        atlas = self.atlases.get(name)
+        if atlas is not None and all(path in self.surfaces and self.surfaces[path].get_abs_parent() is atlas
+                                     for path in paths):
+            return atlas
+
+        images = {path: self.load(path) for path in dict.fromkeys(paths)}
+        unique = list({id(surf): surf for surf in images.values()}.values())  # 共享的图片只打包一次
+        atlas, rects = pack_surfaces(unique, width)
+        subsurfaces = {id(surf): atlas.subsurface(rect) for surf, rect in zip(unique, rects)}
+        for path, surf in images.items():
+            self.surfaces[path] = subsurfaces[id(surf)]
+        for key, surf in self.fingerprints.items():
+            self.fingerprints[key] = subsurfaces.get(id(surf), surf)
+        self.atlases[name] = atlas
+        return atlas
+
+    def pixel_bytes(self):
+        """所有缓存surface实际占用的像素内存, 图集只计算一次"""
+        roots = {}
+        for surf in self.surfaces.values():
+            root = surf.get_abs_parent()
+            roots[id(root)] = root
+        return sum(root.get_pitch() * root.get_height() for root in roots.values())
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'surfaces': len(self.surfaces),
+            'stubs': len(self.stubs),
+            'atlases': len(self.atlases),
+            'shared': self.shared,
+            'pixel_bytes': self.pixel_bytes(),
+        }
+
+
+def pack_surfaces(surfaces, width=ATLAS_WIDTH):
+    """按行(shelf)把surface打包进一张图集, 高的先放, 返回 (图集, 每个surface在图集中的rect)"""
+    order = sorted(range(len(surfaces)), key=lambda index: -surfaces[index].get_height())
+
+    rects = [None] * len(surfaces)
+    x = y = shelf_height = 0
+    for index in order:
+        w, h = surfaces[index].get_size()
+        if x + w > width:
+            x, y = 0, y + shelf_height
+            shelf_height = 0
+        rects[index] = pygame.Rect(x, y, w, h)
+        x += w
+        shelf_height = max(shelf_height, h)
+
+    atlas = pygame.Surface((width, y + shelf_height), pygame.SRCALPHA).convert_alpha()
+    for surf, rect in zip(surfaces, rects):
+        atlas.blit(surf, rect)
+    return atlas, rects
+
+
+def natural_key(path):
+    """按自然顺序排序, 保证 '2.png' 排在 '10.png' 之前"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', path)]
+
+
+def folder_images(path):
+    """返回文件夹下所有图片的路径, 顺序与文件系统无关"""
+    images = [os.path.join(folder, image).replace('\\', '/')
+              for folder, _, files in os.walk(path) for image in files]
+    return sorted(images, key=natural_key)
+
+
+registry = AssetRegistry()
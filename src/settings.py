@@ -1,10 +1,48 @@
 from pygame.math import Vector2
+from pygame.locals import K_F3, K_F4, K_F5, K_F6, K_F8, K_F9
 
 # screen
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 TILE_SIZE = 64
 
+# game loop
+FPS_CAP = 60  # 0 表示不限制帧率
+FIXED_TIMESTEP = 1 / 60  # 模拟步长(秒), None 表示每帧使用实际dt更新
+MAX_CATCHUP_STEPS = 5  # 卡顿后一帧内最多追赶的模拟步数
+
+# 局部重绘: 缓存静态背景, 只提交变化的屏幕区域
+DIRTY_RENDERING = True
+
+# 渲染缩放: 世界画在较小的离屏surface上再放大到窗口, 界面保持原分辨率; 运行时用RENDER_SCALE_KEY切换
+RENDER_SCALE = 1
+RENDER_SCALES = (1, 0.75, 0.5)
+RENDER_SCALE_KEY = K_F6
+
+# map
+MAP_PATH = 'assets/data/map.tmx'
+LEVEL_CACHE_PATH = 'cache/map.lvl'  # 编译后的关卡缓存, tmx/tsx变化时自动重建
+
+# 视口裁剪时摄像机范围向外扩展的距离
+CULL_MARGIN = TILE_SIZE
+
+# 地图内容按类别决定相同centery时的绘制先后, 与整张地图一次性创建时的顺序一致;
+# 其余sprite(玩家、掉落物等)排在这些类别之后
+MAP_DRAW_ORDER = ('house', 'fence', 'water', 'tree', 'grass')
+
+# 静态瓦片预合成时每个chunk的边长(瓦片数), 世界也按这个大小分块加载
+CHUNK_SIZE = 16
+
+# 屏幕外多远的chunk需要加载; 超出加载范围再远STREAM_UNLOAD_MARGIN后才卸载
+STREAM_MARGIN = CHUNK_SIZE * TILE_SIZE // 2
+STREAM_UNLOAD_MARGIN = CHUNK_SIZE * TILE_SIZE
+
+# 小图打包成图集时图集的宽度
+ATLAS_WIDTH = 2048
+
+# 并行解码图片的线程数
+LOAD_WORKERS = 4
+
 # overlay positions 
 OVERLAY_POSITIONS = {
     'tool': (40, SCREEN_HEIGHT - 15),
@@ -31,11 +69,39 @@ LAYERS = {
     'rain drops': 10
 }
 
+# debug
+PROFILE_FRAMES = 300  # 环形缓冲区保留的帧数
+PROFILE_PHASES = ('draw', 'update', 'overlay', 'frame')
+PROFILE_COUNTERS = ('sprites drawn', 'sprites culled', 'collision checks')
+PROFILE_RECORD_KEY = K_F8  # 不显示HUD时开始/停止记录
+PROFILE_EXPORT_KEY = K_F9  # 还没有记录时先开始记录
+PROFILE_EXPORT_PATH = 'profile'  # 导出为 profile.csv 和 profile.json
+DEBUG_KEYS = {
+    K_F3: 'hud',
+    K_F4: 'hitboxes',
+    K_F5: 'trace'
+}
+
+# animation speed (frames per second)
+WATER_ANIMATION_SPEED = 5
+
+# rain, 雨滴和地面水花各一个粒子池
+RAIN_CAPACITY = 4096  # 每个池最多同时存在的粒子数
+RAIN_DROP_RATE = 1500  # 每秒生成的雨滴数
+RAIN_FLOOR_RATE = 600  # 每秒生成的地面水花数
+RAIN_DIRECTION = (-2, 4)
+RAIN_SPEED = (200, 250)
+RAIN_LIFETIME = (0.4, 0.5)  # 秒
+RAIN_CHANCE = 0.3  # 每天下雨的概率
+
 APPLE_POS = {
     'Small': [(18, 17), (30, 37), (12, 50), (30, 45), (20, 30), (30, 10)],
     'Large': [(30, 24), (60, 65), (50, 50), (16, 40), (45, 50), (42, 70)]
 }
 
+# 模拟时间中一天的长度(毫秒), 每天作物生长一次
+DAY_LENGTH = 60 * 1000
+
 GROW_SPEED = {
     'corn': 1,
     'tomato': 0.7
@@ -51,3 +117,7 @@ PURCHASE_PRICES = {
     'corn': 4,
     'tomato': 5
 }
+
+# navigation, 动物和NPC按flow field走向目标
+NAV_CACHE_SIZE = 16  # 最多缓存的flow field数量, 超出时淘汰最久没用过的
+AGENT_SPEED = 120
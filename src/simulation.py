@@ -0,0 +1,191 @@
+"""无窗口的多农场模拟
+
+每个农场在独立进程中用自己的随机种子运行Level的游戏逻辑(树、苹果、土地、作物、碰撞、定时器),
+不解码图片也不绘制. 脚本策略每天开始时操作玩家, 傍晚出售物品并购买种子.
+结果按完成顺序返回, 最后按策略汇总.
+在项目根目录运行:
+
+    python src/simulation.py --farms 32 --days 20 --policies corn tomato mixed lumberjack
+"""
+import argparse
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from settings import *
+
+PLOTS = 24  # 每个农场耕种的瓦片数量, 从玩家出生点附近的可开垦土地中选择
+
+
+def place_player(player, target):
+    """把玩家放到面朝下方时工具正好指向target的位置"""
+    player.status = 'down_idle'
+    center = pygame.math.Vector2(target) - PLAYER_TOOL_OFFSET['down']
+    player.pos.update(center)
+    player.rect.center = player.hitbox.center = (round(center.x), round(center.y))
+
+
+def tile_center(tile):
+    return tile[0] * TILE_SIZE + TILE_SIZE // 2, tile[1] * TILE_SIZE + TILE_SIZE // 2
+
+
+def use(player, tool, target):
+    place_player(player, target)
+    player.selected_tool = tool
+    player.get_tool_target_pos()
+    player.use_tool()
+
+
+def farm_plots(level, count=PLOTS):
+    """出生点附近可开垦的瓦片, 由近到远"""
+    from soil import FARMABLE
+    ys, xs = (level.soil_grid.flags & FARMABLE).nonzero()
+    px, py = int(level.player.pos.x) // TILE_SIZE, int(level.player.pos.y) // TILE_SIZE
+    tiles = sorted(zip(xs.tolist(), ys.tolist()), key=lambda tile: (tile[0] - px) ** 2 + (tile[1] - py) ** 2)
+    return tiles[:count]
+
+
+def tend_crops(level, plots, seeds):
+    """收获成熟的作物, 在空地上轮流种下seeds中的作物, 然后浇水"""
+    player = level.player
+    field = level.crop_field
+    for index, tile in enumerate(plots):
+        target = tile_center(tile)
+        level.harvest(pygame.Rect(tile[0] * TILE_SIZE, tile[1] * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+        if field.grid[tile[1], tile[0]] == -1:
+            use(player, 'hoe', target)
+            player.selected_seed = seeds[index % len(seeds)]
+            player.use_seed()
+        use(player, 'water', target)
+
+
+def chop_trees(level, hits=5):
+    """砍最近的一棵还活着的树, 不够一棵时只摘苹果"""
+    player = level.player
+    trees = [tree for tree in level.tree_sprites if tree.alive]
+    if not trees:
+        return
+    tree = min(trees, key=lambda tree: player.pos.distance_squared_to(tree.hitbox.center))
+    for _ in range(hits):
+        use(player, 'axe', tree.hitbox.center)
+
+
+# 策略 -> (每天的操作, 购买的种子)
+POLICIES = {
+    'corn': (lambda level, plots: tend_crops(level, plots, ['corn']), ['corn']),
+    'tomato': (lambda level, plots: tend_crops(level, plots, ['tomato']), ['tomato']),
+    'mixed': (lambda level, plots: tend_crops(level, plots, ['corn', 'tomato']), ['corn', 'tomato']),
+    'lumberjack': (lambda level, plots: chop_trees(level), []),
+}
+
+
+def trade(player, seeds, spend=0.5):
+    """出售所有物品, 用最多spend比例的钱把种子补足到PLOTS个"""
+    earned = 0
+    for item, amount in player.item_inventory.items():
+        earned += amount * SALE_PRICES[item]
+        player.item_inventory[item] = 0
+    player.money += earned
+
+    budget = int(player.money * spend)
+    wanted = max(PLOTS - sum(player.seed_inventory[seed] for seed in set(seeds)), 0)
+    for seed in (seeds * PLOTS)[:wanted]:
+        if budget < PURCHASE_PRICES[seed]:
+            break
+        player.seed_inventory[seed] += 1
+        player.money -= PURCHASE_PRICES[seed]
+        budget -= PURCHASE_PRICES[seed]
+    return earned
+
+
+def simulate_farm(seed, policy, days, dt=0.5):
+    """运行一个农场days天, 返回经济结果"""
+    from level import Level
+
+    random.seed(seed)
+    start = perf_counter()
+    level = Level(seed=seed, headless=True)
+    plots = farm_plots(level)
+    act, seeds = POLICIES[policy]
+
+    income = []
+    while level.day < days:
+        act(level, plots)
+        day = level.day
+        while level.day == day:
+            level.update(dt)
+        income.append(trade(level.player, seeds))
+
+    player = level.player
+    return {
+        'seed': seed,
+        'policy': policy,
+        'days': days,
+        'money': player.money,
+        'income': sum(income),
+        'seeds_left': sum(player.seed_inventory.values()),
+        'crops': len(level.crop_field),
+        'trees_felled': sum(not tree.alive for tree in level.tree_objects)
+                        + sum(state['health'] <= 0 for state in level.tree_states.values()),
+        'seconds': perf_counter() - start,
+    }
+
+
+def ensure_level_cache():
+    """编译缓存失效时需要显示器来解码图块, 在启动工作进程前用dummy显示编译一次"""
+    from levelcache import compile_level, read_level
+
+    if read_level(MAP_PATH, LEVEL_CACHE_PATH, headless=True) is None:
+        pygame.init()
+        pygame.display.set_mode((1, 1))
+        compile_level(MAP_PATH, LEVEL_CACHE_PATH)
+        pygame.quit()
+
+
+def summarize(results):
+    """按策略汇总 {'farms', 'mean', 'min', 'max'} (最终金钱)"""
+    by_policy = {}
+    for result in results:
+        by_policy.setdefault(result['policy'], []).append(result['money'])
+    return {policy: {'farms': len(money), 'mean': sum(money) / len(money), 'min': min(money), 'max': max(money)}
+            for policy, money in by_policy.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless multi-farm simulation')
+    parser.add_argument('--farms', type=int, default=16, help='farms per policy')
+    parser.add_argument('--days', type=int, default=10)
+    parser.add_argument('--policies', nargs='+', choices=sorted(POLICIES), default=sorted(POLICIES))
+    parser.add_argument('--workers', type=int, default=None, help='process count, defaults to the CPU count')
+    parser.add_argument('--dt', type=float, default=0.5, help='simulation step in seconds')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first farm')
+    args = parser.parse_args()
+
+    ensure_level_cache()
+    start = perf_counter()
+    results = []
+    with ProcessPoolExecutor(args.workers) as pool:
+        futures = [pool.submit(simulate_farm, args.seed + farm, policy, args.days, args.dt)
+                   for policy in args.policies for farm in range(args.farms)]
+        # 先完成的农场先输出
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[{len(results)}/{len(futures)}] {result['policy']:<10} seed {result['seed']:<5} "
+                  f"money {result['money']:6d}  income {result['income']:6d}  "
+                  f"felled {result['trees_felled']:3d}  {result['seconds']:.2f} s", flush=True)
+
+    print(f'{len(results)} farms x {args.days} days in {perf_counter() - start:.1f} s')
+    for policy, stats in summarize(results).items():
+        print(f"  {policy:<10} farms {stats['farms']:3d}  money mean {stats['mean']:8.1f}  "
+              f"min {stats['min']:6d}  max {stats['max']:6d}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import numpy as np
+import pygame
+from settings import *
+from sprites import Generic
+from support import import_folder
+from resources import registry
+
+# 每个瓦片一个字节的标记位
+FARMABLE = 1
+TILLED = 2
+WATERED = 4
+
+# 四邻域位掩码 -> 土地贴图, 上下左右分别是有没有相邻的已开垦土地
+TOP, RIGHT, BOTTOM, LEFT = 1, 2, 4, 8
+AUTOTILE = {
+    0: 'o',
+    TOP: 'b',
+    RIGHT: 'l',
+    BOTTOM: 't',
+    LEFT: 'r',
+    TOP | BOTTOM: 'tb',
+    LEFT | RIGHT: 'lr',
+    RIGHT | BOTTOM: 'tl',
+    LEFT | BOTTOM: 'tr',
+    TOP | RIGHT: 'bl',
+    TOP | LEFT: 'br',
+    TOP | RIGHT | BOTTOM: 'tbr',
+    TOP | LEFT | BOTTOM: 'tbl',
+    LEFT | RIGHT | BOTTOM: 'lrt',
+    LEFT | RIGHT | TOP: 'lrb',
+    TOP | RIGHT | BOTTOM | LEFT: 'x',
+}
+
+
+class SoilGrid:
+    """整张地图的土地状态, 每个瓦片用一个uint8保存FARMABLE/TILLED/WATERED标记"""
+
+    def __init__(self, farmable):
+        self.flags = np.where(farmable, FARMABLE, 0).astype(np.uint8)
+
+    def inside(self, x, y):
+        height, width = self.flags.shape
+        return 0 <= x < width and 0 <= y < height
+
+    def tilled(self, x, y):
+        return bool(self.flags[y, x] & TILLED)
+
+    def watered(self, x, y):
+        return bool(self.flags[y, x] & WATERED)
+
+    def till(self, x, y):
+        """可以开垦且还没开垦时开垦, 返回状态是否变化"""
+        if self.flags[y, x] & (FARMABLE | TILLED) != FARMABLE:
+            return False
+        self.flags[y, x] |= TILLED
+        return True
+
+    def water(self, x, y):
+        if self.flags[y, x] & (TILLED | WATERED) != TILLED:
+            return False
+        self.flags[y, x] |= WATERED
+        return True
+
+    def dry(self):
+        """新的一天土地变干, 返回之前浇过水的瓦片 (xs, ys)"""
+        ys, xs = np.nonzero(self.flags & WATERED)
+        self.flags &= ~np.uint8(WATERED)
+        return xs, ys
+
+    def variant(self, x, y):
+        """根据四邻域中已开垦的瓦片选择贴图"""
+        mask = 0
+        for bit, (dx, dy) in ((TOP, (0, -1)), (RIGHT, (1, 0)), (BOTTOM, (0, 1)), (LEFT, (-1, 0))):
+            if self.inside(x + dx, y + dy) and self.flags[y + dy, x + dx] & TILLED:
+                mask |= bit
+        return AUTOTILE[mask]
+
+
+class SoilLayer:
+    """把已加载chunk里的土地画在每个chunk两张缓存surface上(soil和soil water图层), 不为每块土地创建sprite
+
+    surface只覆盖chunk内可开垦的范围; 一个瓦片变化时只重画它和周围8个瓦片
+    """
+
+    def __init__(self, grid, streamer, group):
+        self.grid = grid
+        self.streamer = streamer
+        self.group = group
+        self.soil_surfs = {name: registry.load(f'assets/graphics/soil/{name}.png') for name in AUTOTILE.values()}
+        self.water_surfs = import_folder('assets/graphics/soil_water')
+        self.loaded = set()
+        self.layers = {}  # chunk -> (soil sprite, soil water sprite)
+
+    def load(self, chunk):
+        self.loaded.add(chunk)
+        x0, y0, x1, y1 = self.streamer.tile_region(chunk)
+        ys, xs = np.nonzero(self.grid.flags[y0:y1, x0:x1] & TILLED)
+        if len(xs):
+            self.redraw_tiles(zip((xs + x0).tolist(), (ys + y0).tolist()))
+
+    def unload(self, chunk):
+        self.loaded.discard(chunk)
+        for sprite in self.layers.pop(chunk, ()):
+            sprite.kill()
+
+    def create_layers(self, chunk):
+        """chunk中第一次出现已开垦的土地时, 按可开垦范围创建两张透明surface"""
+        x0, y0, x1, y1 = self.streamer.tile_region(chunk)
+        ys, xs = np.nonzero(self.grid.flags[y0:y1, x0:x1] & FARMABLE)
+        left, top = (int(xs.min()) + x0) * TILE_SIZE, (int(ys.min()) + y0) * TILE_SIZE
+        size = ((int(xs.max()) - int(xs.min()) + 1) * TILE_SIZE, (int(ys.max()) - int(ys.min()) + 1) * TILE_SIZE)
+        layers = []
+        for z in (LAYERS['soil'], LAYERS['soil water']):
+            sprite = Generic((left, top), pygame.Surface(size, pygame.SRCALPHA).convert_alpha(), self.group, z=z)
+            sprite.sprite_type = 'soil'
+            layers.append(sprite)
+        self.layers[chunk] = tuple(layers)
+        return self.layers[chunk]
+
+    def tile_at(self, pos):
+        x, y = int(pos[0]) // TILE_SIZE, int(pos[1]) // TILE_SIZE
+        return (x, y) if self.grid.inside(x, y) else None
+
+    def till(self, pos):
+        tile = self.tile_at(pos)
+        if tile and self.grid.till(*tile):
+            # 相邻瓦片的贴图也可能变化
+            x, y = tile
+            self.redraw_tiles((x + dx, y + dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1))
+            return True
+        return False
+
+    def water(self, pos):
+        tile = self.tile_at(pos)
+        if tile and self.grid.water(*tile):
+            self.redraw_tiles([tile])
+            return True
+        return False
+
+    def dry(self):
+        xs, ys = self.grid.dry()
+        self.redraw_tiles(zip(xs.tolist(), ys.tolist()))
+
+    def redraw_tiles(self, tiles):
+        grid = self.grid
+        size = self.streamer.chunk_size
+        changed = {}
+        for x, y in tiles:
+            chunk = (x // size, y // size)
+            if chunk not in self.loaded or not grid.inside(x, y) or not grid.flags[y, x] & FARMABLE:
+                continue
+            layers = self.layers.get(chunk)
+            if layers is None:
+                if not grid.flags[y, x] & TILLED:
+                    continue
+                layers = self.create_layers(chunk)
+            soil, soil_water = layers
+            rect = pygame.Rect(x * TILE_SIZE - soil.rect.x, y * TILE_SIZE - soil.rect.y, TILE_SIZE, TILE_SIZE)
+            soil.image.fill((0, 0, 0, 0), rect)
+            soil_water.image.fill((0, 0, 0, 0), rect)
+            if grid.flags[y, x] & TILLED:
+                soil.image.blit(self.soil_surfs[grid.variant(x, y)], rect)
+            if grid.flags[y, x] & WATERED:
+                # 同一块土地总是使用同一张水渍贴图
+                soil_water.image.blit(self.water_surfs[(x * 7 + y * 13) % len(self.water_surfs)], rect)
+            changed[chunk] = layers
+
+        # 缓存的surface被原地修改, 通知摄像机组(局部重绘的背景缓存失效)
+        for layers in changed.values():
+            for sprite in layers:
+                self.group.refresh(sprite)
@@ -0,0 +1,65 @@
+from settings import *
+
+
+class SpatialGrid:
+    """均匀网格空间索引, 按格子记录与之相交的对象"""
+
+    def __init__(self, cell_size=TILE_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (col, row) -> {item: None}, 用dict保证插入顺序稳定
+        self.item_cells = {}  # item -> 该对象占据的格子范围 (left, top, right, bottom)
+
+    def cell_range(self, rect):
+        """返回rect覆盖的格子范围(包含两端)"""
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def insert(self, item, rect):
+        bounds = self.cell_range(rect)
+        self.item_cells[item] = bounds
+        left, top, right, bottom = bounds
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                self.cells.setdefault((col, row), {})[item] = None
+
+    def remove(self, item):
+        bounds = self.item_cells.pop(item, None)
+        if bounds is None:
+            return
+        left, top, right, bottom = bounds
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                cell = self.cells[(col, row)]
+                del cell[item]
+                if not cell:
+                    del self.cells[(col, row)]
+
+    def move(self, item, rect):
+        """对象移动后更新索引, 格子范围没变时不做任何事"""
+        if self.item_cells.get(item) != self.cell_range(rect):
+            self.remove(item)
+            self.insert(item, rect)
+
+    def query(self, rect):
+        """返回与rect所覆盖格子相交的对象, 顺序稳定且不重复"""
+        found = {}
+        left, top, right, bottom = self.cell_range(rect)
+        cells = self.cells
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                cell = cells.get((col, row))
+                if cell:
+                    found.update(cell)
+        return found.keys()
+
+    def query_point(self, pos):
+        """返回pos所在格子中的对象, 只查一个格子"""
+        size = self.cell_size
+        return self.cells.get((int(pos[0]) // size, int(pos[1]) // size), {}).keys()
+
+    def __contains__(self, item):
+        return item in self.item_cells
+
+    def __len__(self):
+        return len(self.item_cells)
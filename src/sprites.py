@@ -2,6 +2,12 @@ from random import randint, choice
 import pygame
 from settings import *
 from timer import Timer
+from resources import registry
+
+
+def default_hitbox(rect):
+    """碰撞箱只取图像底部中间的一块"""
+    return rect.copy().inflate(-rect.width * 0.2, -rect.height * 0.75)
 
 
 class Generic(pygame.sprite.Sprite):
@@ -10,7 +16,7 @@ class Generic(pygame.sprite.Sprite):
         self.image = surf
         self.rect = self.image.get_rect(topleft=pos)
         self.z = z
-        self.hitbox = self.rect.copy().inflate(-self.rect.width * 0.2, -self.rect.height * 0.75)
+        self.hitbox = default_hitbox(self.rect)
 
         # 添加类型标识属性
         self.sprite_type = self.__class__.__name__.lower()
@@ -27,28 +33,29 @@ class Generic(pygame.sprite.Sprite):
 
 
 class Water(Generic):
-    def __init__(self, pos, frames, groups):
-        # animation setup
-        self.frames = frames
-        self.frame_index = 0
+    animated = True  # 图像随动画时钟变化
+
+    def __init__(self, pos, clock, groups):
+        # animation setup, 所有水面共享同一个时钟, 自身不需要update
+        self.clock = clock
 
         # sprite setup
         super().__init__(
             pos=pos,
-            surf=self.frames[self.frame_index],
+            surf=self.clock.frame,
             groups=groups,
             z=LAYERS['water']
         )
         self.sprite_type = 'water'
 
-    def animate(self, dt):
-        self.frame_index += 5 * dt
-        if self.frame_index >= len(self.frames):
-            self.frame_index = 0
-        self.image = self.frames[int(self.frame_index)]
+    @property
+    def image(self):
+        # 只在绘制时读取, 不在屏幕内的水面没有任何开销
+        return self.clock.frame
 
-    def update(self, dt):
-        self.animate(dt)
+    @image.setter
+    def image(self, surf):
+        pass  # 图像由动画时钟决定, 忽略Generic中的赋值
 
 
 class WildFlower(Generic):
@@ -59,36 +66,67 @@ class WildFlower(Generic):
 
 
 class Tree(Generic):
-    def __init__(self, pos, surf, groups, name):
+    def __init__(self, pos, surf, groups, name, scheduler, player_add=None, on_fell=None, state=None):
         super().__init__(pos, surf, groups)
 
-        # tree属性
-        self.health = 5
+        # tree属性, state是卸载前save_state保存的状态
+        self.health = state['health'] if state else 5
+        self.player_add = player_add  # 掉落的苹果和木头加入玩家物品栏
+        self.on_fell = on_fell  # on_fell(tree), 被砍倒时调用, 从保存的状态恢复树桩时不调用
         self.alive = True
         stump_path = f'assets/graphics/stumps/{"small" if name == "Small" else "large"}.png'
-        self.stump_surf = pygame.image.load(stump_path).convert_alpha()  # 树桩
-        self.invul_timer = Timer(200)  # invulnerability timer 无敌时间
+        self.stump_surf = registry.load(stump_path)  # 树桩, 所有树共享同一个surface
+        self.invul_timer = Timer(200, scheduler=scheduler)  # invulnerability timer 无敌时间
 
         # apples
-        self.apple_surf = pygame.image.load('assets/graphics/fruit/apple.png').convert_alpha()
+        self.apple_surf = registry.load('assets/graphics/fruit/apple.png')
         self.apple_pos = APPLE_POS[name]
         self.apple_sprites = pygame.sprite.Group()
-        self.create_apple()
+        self.create_apple(state['apples'] if state else None)
 
         self.sprite_type = f'tree_{name}'
-        print(f"Tree created with {len(self.apple_sprites)} apples")  # 调试信息
+        if self.health <= 0:
+            self.fell()  # 卸载前已经被砍倒
 
     def damage(self):
-        # 树被攻击
+        # 树被攻击, 砍倒后不再受伤
+        if not self.alive:
+            return
         self.health -= 1
 
         # 掉落苹果
         if len(self.apple_sprites.sprites()) > 0:
             random_apple = choice(self.apple_sprites.sprites())
-            print(f'remove apple at {random_apple.rect.center}')
             random_apple.kill()
+            if self.player_add:
+                self.player_add('apple')
+
+        if self.health <= 0:
+            self.fell()
+            if self.player_add:
+                self.player_add('wood')
+            if self.on_fell:
+                self.on_fell(self)
+
+    def fell(self):
+        """换成树桩, 碰撞箱随之缩小"""
+        for apple in self.apple_sprites.sprites():
+            apple.kill()
+        self.image = self.stump_surf
+        self.rect = self.image.get_rect(midbottom=self.rect.midbottom)
+        self.hitbox = self.rect.copy().inflate(-10, -self.rect.height * 0.6)
+        self.alive = False
+
+        # rect和hitbox变化后同步摄像机组和碰撞组的空间索引
+        for group in self.groups():
+            if hasattr(group, 'refresh'):
+                group.refresh(self)
+
+    def save_state(self):
+        """所在chunk卸载时保存, 重新加载后恢复血量和剩下的苹果"""
+        return {'health': self.health, 'apples': [apple.apple_index for apple in self.apple_sprites]}
 
-    def create_apple(self):
+    def create_apple(self, indices=None):
         from level import CameraGroup
         all_sprites = None
         for group in self.groups():
@@ -97,16 +135,21 @@ class Tree(Generic):
                 all_sprites = group
                 break  # 找到后退出循环
 
-        for pos in self.apple_pos:
-            if randint(0, 9) < 2:  # 每个苹果有五分之一的概率出现
-                x = pos[0] + self.rect.left
-
-                y = pos[1] + self.rect.top
-                # 创建苹果, 添加进apple_sprites组中
-                apple = Generic(pos=(x, y),
-                                surf=self.apple_surf,
-                                groups=[self.apple_sprites, all_sprites],
-                                z=LAYERS['fruit']
-                                )
-                apple.sprite_type = 'apple'
-                # print(f'create apple at {x, y}')
+        if indices is None:
+            # 每个苹果有五分之一的概率出现
+            indices = [index for index in range(len(self.apple_pos)) if randint(0, 9) < 2]
+
+        for index in indices:
+            pos = self.apple_pos[index]
+            x = pos[0] + self.rect.left
+
+            y = pos[1] + self.rect.top
+            # 创建苹果, 添加进apple_sprites组中
+            apple = Generic(pos=(x, y),
+                            surf=self.apple_surf,
+                            groups=[self.apple_sprites, all_sprites],
+                            z=LAYERS['fruit']
+                            )
+            apple.sprite_type = 'apple'
+            apple.apple_index = index  # 在APPLE_POS中的序号, 用于保存状态
+            # print(f'create apple at {x, y}')
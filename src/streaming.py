@@ -0,0 +1,66 @@
+import pygame
+from settings import *
+
+
+class ChunkStreamer:
+    """把世界划分为边长CHUNK_SIZE个瓦片的chunk, 只保留玩家附近的chunk
+
+    load(chunk) 创建chunk内的对象并返回它们, unload(chunk, objects) 负责保存状态并销毁.
+    跨越多个chunk的对象(合并后的碰撞箱、地面)用acquire/release按引用计数共享
+    """
+
+    def __init__(self, width, height, load, unload, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunk_pixels = chunk_size * TILE_SIZE
+        self.columns = -(-width // chunk_size)
+        self.rows = -(-height // chunk_size)
+        self.load = load
+        self.unload = unload
+        self.loaded = {}  # chunk -> 该chunk创建的对象
+        self.shared = {}  # key -> [对象, 引用计数]
+
+    def chunk_at(self, x, y):
+        return int(x) // self.chunk_pixels, int(y) // self.chunk_pixels
+
+    def chunks_in(self, rect):
+        """与rect相交的chunk, 按行优先顺序, 超出地图的部分忽略"""
+        size = self.chunk_pixels
+        left, top = max(rect.left // size, 0), max(rect.top // size, 0)
+        right = min((rect.right - 1) // size, self.columns - 1)
+        bottom = min((rect.bottom - 1) // size, self.rows - 1)
+        return [(col, row) for row in range(top, bottom + 1) for col in range(left, right + 1)]
+
+    def tile_region(self, chunk):
+        """chunk覆盖的瓦片范围 (x0, y0, x1, y1), 不含x1和y1"""
+        col, row = chunk
+        size = self.chunk_size
+        return col * size, row * size, (col + 1) * size, (row + 1) * size
+
+    def update(self, center):
+        """以center为中心, 加载进入范围的chunk, 卸载远离的chunk
+
+        卸载范围比加载范围大STREAM_UNLOAD_MARGIN, 在chunk边界附近来回走动时不会反复加载
+        """
+        load_rect = pygame.Rect(0, 0, SCREEN_WIDTH + STREAM_MARGIN * 2, SCREEN_HEIGHT + STREAM_MARGIN * 2)
+        load_rect.center = center
+        keep = set(self.chunks_in(load_rect.inflate(STREAM_UNLOAD_MARGIN * 2, STREAM_UNLOAD_MARGIN * 2)))
+
+        # 先卸载再加载, 同时存在的chunk数量不超过保留范围
+        for chunk in [chunk for chunk in self.loaded if chunk not in keep]:
+            self.unload(chunk, self.loaded.pop(chunk))
+        for chunk in self.chunks_in(load_rect):
+            if chunk not in self.loaded:
+                self.loaded[chunk] = self.load(chunk)
+
+    def acquire(self, key, create):
+        entry = self.shared.get(key)
+        if entry is None:
+            entry = self.shared[key] = [create(), 0]
+        entry[1] += 1
+
+    def release(self, key, destroy):
+        entry = self.shared[key]
+        entry[1] -= 1
+        if not entry[1]:
+            del self.shared[key]
+            destroy(entry[0])
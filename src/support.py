@@ -1,16 +1,45 @@
-from os import walk
 import pygame
+from settings import *
+from resources import registry, folder_images, fingerprint, same_pixels
 
 
 def import_folder(path):
-    surface_list = []
+    # 按文件名自然顺序加载, 保证动画帧顺序在不同机器上一致
+    return [registry.load(full_path) for full_path in folder_images(path)]
 
-    # 遍历文件夹
-    for _, __, img_files in walk(path):
-        # 加载每个素材下的所有图片
-        for image in img_files:
-            full_path = path + '/' + image
-            image_surf = pygame.image.load(full_path).convert_alpha()
-            surface_list.append(image_surf)
 
-    return surface_list
+def bake_tiles(tiles, chunk_size=CHUNK_SIZE, row_strips=False, shared=None):
+    """在加载时把静态瓦片合成为大块surface, 返回 [(pos, surf)]
+
+    row_strips为True时, 每个chunk再按瓦片行切成条带, 条带的centery与原瓦片相同,
+    因此仍能和玩家等sprite正确地y排序. 每段连续的非空瓦片单独成一条, 不为空白部分分配像素.
+    shared是 {fingerprint: surface} (可以是WeakValueDictionary), 像素相同的结果共用一个surface
+    """
+    tiles = list(tiles)
+    occupied = {(x, y) for x, y, _ in tiles}
+
+    def run_start(x, y):
+        # 同一chunk内向左找到这段连续瓦片的起点
+        while (x - 1, y) in occupied and (x - 1) // chunk_size == x // chunk_size:
+            x -= 1
+        return x
+
+    chunks = {}
+    for x, y, surf in tiles:
+        key = (y, run_start(x, y)) if row_strips else (y // chunk_size, x // chunk_size)
+        chunks.setdefault(key, []).append((surf, surf.get_rect(topleft=(x * TILE_SIZE, y * TILE_SIZE))))
+
+    baked = []
+    for key in sorted(chunks):
+        chunk_tiles = chunks[key]
+        bounds = chunk_tiles[0][1].unionall([rect for _, rect in chunk_tiles])
+        chunk_surf = pygame.Surface(bounds.size, pygame.SRCALPHA).convert_alpha()
+        # 按传入顺序叠加, 与逐个瓦片绘制时的覆盖关系一致
+        for surf, rect in chunk_tiles:
+            chunk_surf.blit(surf, rect.move(-bounds.x, -bounds.y))
+        if shared is not None:
+            existing = shared.setdefault(fingerprint(chunk_surf), chunk_surf)
+            if same_pixels(existing, chunk_surf):
+                chunk_surf = existing
+        baked.append((bounds.topleft, chunk_surf))
+    return baked
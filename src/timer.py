@@ -1,25 +1,74 @@
+import heapq
+from itertools import count
 import pygame
 
 
+class Scheduler:
+    """按到期时间排列的最小堆, 每帧只唤醒已到期的定时器, 空闲的定时器没有任何开销
+
+    clock返回当前时间(毫秒), 默认是真实时间; Level注入模拟时间, 使定时器跟随固定步长或加速模拟
+    """
+
+    def __init__(self, clock=pygame.time.get_ticks):
+        self.clock = clock
+        self.queue = []  # (到期时间, 序号, 定时器, 激活代数)
+        self.counter = count()  # 到期时间相同时按加入顺序触发
+
+    def now(self):
+        return self.clock()
+
+    def schedule(self, timer):
+        heapq.heappush(self.queue, (timer.start_time + timer.duration, next(self.counter), timer, timer.generation))
+
+    def update(self):
+        now = self.clock()
+        queue = self.queue
+        while queue and queue[0][0] <= now:
+            _, _, timer, generation = heapq.heappop(queue)
+            # 定时器被重新激活或取消后, 堆中的旧条目直接丢弃
+            if timer.active and timer.generation == generation:
+                timer.expire()
+
+    def __len__(self):
+        return len(self.queue)
+
+
 class Timer:
-    def __init__(self, duration, func=None):
+    def __init__(self, duration, func=None, scheduler=None):
         self.duration = duration
         self.func = func
         self.start_time = 0
         self.active = False
 
+        # 有scheduler时由它在到期时调用expire, 不需要每帧update
+        self.scheduler = scheduler
+        self.generation = 0
+
     def activate(self):
-        # print("activate")
         self.active = True
-        self.start_time = pygame.time.get_ticks()
+        self.generation += 1
+        if self.scheduler is not None:
+            self.start_time = self.scheduler.now()
+            self.scheduler.schedule(self)
+        else:
+            self.start_time = pygame.time.get_ticks()
 
     def deactivate(self):
         self.active = False
         self.start_time = 0
+        self.generation += 1
+
+    def expire(self):
+        # 先停用再回调, 回调中可以重新激活自己
+        self.deactivate()
+        if self.func:
+            self.func()
 
     def update(self):
+        # 没有scheduler的定时器需要每帧轮询
         current_time = pygame.time.get_ticks()
         if current_time - self.start_time >= self.duration:
-            if self.func and self.start_time != 0:
-                self.func()
-            self.deactivate()
+            if self.active:
+                self.expire()
+            else:
+                self.deactivate()